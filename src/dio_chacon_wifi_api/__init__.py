@@ -1,5 +1,6 @@
 """DIO Chacon API REST + websocket Client."""
 
 from .client import DIOChaconAPIClient
+from .pool import DIOChaconAccountPool
 
-__all__ = ["DIOChaconAPIClient"]
+__all__ = ["DIOChaconAPIClient", "DIOChaconAccountPool"]
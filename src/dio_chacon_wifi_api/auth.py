@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""HTTP login to the DIO Chacon cloud and stores of the session tokens it returns."""
+import json
+import logging
+import os
+
+import aiohttp
+
+from .exceptions import DIOChaconAPIError
+from .exceptions import DIOChaconInvalidAuthError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def fetch_session_token(
+    aiohttp_session: aiohttp.ClientSession, login_url: str, login_email: str, password: str
+) -> str:
+    """Logs in with the HTTP login of the cloud server and returns a session token for the websocket.
+
+    Parameters:
+        aiohttp_session: the HTTP session used for the login request.
+        login_url: the URL of the HTTP login service.
+        login_email: your email in DIO app
+        password: your password in DIO app
+
+    Returns:
+        The session token to authenticate the websocket with.
+    """
+    body = {"email": login_email, "password": password, "installationId": "top"}
+    async with aiohttp_session.post(login_url, json=body) as response:
+        response.raise_for_status()
+        raw_results = await response.json(content_type=None)
+
+    if raw_results.get("status") != 200:
+        _LOGGER.debug("Invalid HTTP login response received : %s", raw_results.get("status"))
+        raise DIOChaconInvalidAuthError("Invalid username/password.")
+    try:
+        return raw_results["data"]["sessionToken"]
+    except (KeyError, TypeError):
+        raise DIOChaconAPIError("No session token in the login response !")
+
+
+class TokenStore:
+    """Stores the session tokens by login email so that they are reused across reconnections and restarts.
+
+    This base class does not keep anything : subclass it to store the tokens elsewhere (secrets manager,
+    application storage...).
+    """
+
+    async def load(self, login_email: str) -> str | None:
+        """Returns the stored session token of the account, None when unknown."""
+        return None
+
+    async def save(self, login_email: str, session_token: str) -> None:
+        """Stores the session token of the account."""
+
+    async def delete(self, login_email: str) -> None:
+        """Forgets the session token of the account, rejected by the server."""
+
+
+class MemoryTokenStore(TokenStore):
+    """Keeps the session tokens in memory, for the lifetime of the process."""
+
+    def __init__(self) -> None:
+        self._tokens: dict[str, str] = dict()
+
+    async def load(self, login_email: str) -> str | None:
+        return self._tokens.get(login_email)
+
+    async def save(self, login_email: str, session_token: str) -> None:
+        self._tokens[login_email] = session_token
+
+    async def delete(self, login_email: str) -> None:
+        self._tokens.pop(login_email, None)
+
+
+class FileTokenStore(TokenStore):
+    """Keeps the session tokens in a JSON file readable by its owner only, to reuse them after a restart."""
+
+    def __init__(self, path: str) -> None:
+        self._path: str = path
+
+    def _read(self) -> dict:
+        try:
+            with open(self._path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as error:
+            _LOGGER.warning("Session tokens file %s unreadable, ignored : %s", self._path, error)
+            return {}
+
+    def _write(self, tokens: dict) -> None:
+        # The tokens are credentials : the file is created with owner only permissions.
+        fd = os.open(self._path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(tokens, file)
+
+    async def load(self, login_email: str) -> str | None:
+        return self._read().get(login_email)
+
+    async def save(self, login_email: str, session_token: str) -> None:
+        tokens = self._read()
+        tokens[login_email] = session_token
+        self._write(tokens)
+
+    async def delete(self, login_email: str) -> None:
+        tokens = self._read()
+        if tokens.pop(login_email, None) is not None:
+            self._write(tokens)
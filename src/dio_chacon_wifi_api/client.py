@@ -2,44 +2,51 @@
 """Client for the DIO Chacon wifi API."""
 
 import asyncio
+import functools
+import inspect
 import logging
+import time
 from asyncio import Lock
 from asyncio import Queue
+from asyncio import Semaphore
 from typing import Any
-from urllib.parse import urlsplit
 
+import aiohttp
+
+from .auth import TokenStore
+from .codec import JSONCodec
+from .const import DEFAULT_DISCONNECT_TIMEOUT
+from .const import DEFAULT_MAX_IN_FLIGHT_REQUESTS
+from .const import DEFAULT_MAX_OUTBOX_SIZE
+from .const import DEFAULT_MAX_PENDING_EVENTS
+from .const import DEFAULT_MAX_PENDING_RESPONSES
+from .const import DEFAULT_RESPONSE_TIMEOUT
 from .const import DeviceTypeEnum
 from .const import DIOCHACON_WS_URL
+from .const import DispatchOverflowEnum
 from .const import ShutterMoveEnum
 from .const import SwitchOnOffEnum
+from .dispatch import CallbackDispatcher
+from .dispatch import EventCoalescer
 from .exceptions import DIOChaconAPIError
 from .exceptions import DIOChaconInvalidAuthError
+from .inventory import device_from_dio_api
+from .inventory import DeviceInventory
+from .links import DEFAULT_LINK_EXTRACTORS
+from .links import extract_links_state
+from .links import LinkExtractor
+from .metrics import ClientMetrics
+from .pending import PendingResponses
+from .records import DeviceState
+from .retry import RetryPolicy
 from .session import DIOChaconClientSession
+from .state import DeviceStateCache
+from .topology import TopologyIndex
+from .utils import WIRE_LOGGER
 
 _LOGGER = logging.getLogger(__name__)
 
 
-def _validated_image_url(url: Any) -> str | None:
-    """Returns the image URL only when its scheme is https and it carries no embedded credentials.
-
-    The helper guards against the most common mis-parses of a raw URL string
-    (non-https scheme, scheme written in mixed case, URL with userinfo). It
-    does not validate the host or the network reachability of the URL.
-    Consumers are still expected to apply their own policy before fetching
-    or rendering the URL.
-    """
-    if not isinstance(url, str):
-        return None
-    parsed = urlsplit(url)
-    if parsed.scheme.lower() != "https":
-        return None
-    if not parsed.hostname:
-        return None
-    if parsed.username or parsed.password:
-        return None
-    return url
-
-
 class DIOChaconAPIClient:
     """Client to the DIO Chacon wifi API.
     It is mainly a proxy to the chacon's cloud server.
@@ -53,6 +60,24 @@ class DIOChaconAPIClient:
         service_name: str = "python_generic",
         callback_device_state: callable = None,
         session_token: str = None,
+        response_timeout: float = DEFAULT_RESPONSE_TIMEOUT,
+        max_in_flight_requests: int = DEFAULT_MAX_IN_FLIGHT_REQUESTS,
+        max_pending_responses: int = DEFAULT_MAX_PENDING_RESPONSES,
+        cache_device_states: bool = False,
+        codec: JSONCodec = None,
+        wire_tracing: bool = False,
+        async_dispatch: bool = False,
+        max_pending_events: int = DEFAULT_MAX_PENDING_EVENTS,
+        overflow_policy: DispatchOverflowEnum = DispatchOverflowEnum.DROP_OLDEST,
+        coalesce_window: float = None,
+        retry_policy: RetryPolicy = None,
+        resync_on_reconnect: bool = None,
+        max_outbox_size: int = DEFAULT_MAX_OUTBOX_SIZE,
+        aiohttp_session: aiohttp.ClientSession = None,
+        connector: aiohttp.BaseConnector = None,
+        token_store: TokenStore = None,
+        callback_inventory: callable = None,
+        device_records: bool = False,
     ) -> None:
         """Initialize the client API. Actually do nothing but storing informations.
         The effective authentication and connection are lazyly achieved.
@@ -61,46 +86,294 @@ class DIOChaconAPIClient:
             login_email: string containing your email in DIO app
             password: string containing your password in DIO app
             service_name: arbitrary string identifying this client
-            callback_device_state: the callback method that will be called for server side events
+            callback_device_state: the callback method that will be called for server side events.
+                It can be a plain function or a coroutine function.
             session_token: token obtained from the HTTP login, used to authenticate
                 the websocket instead of the email and password
+            response_timeout: default delay in seconds to wait for the server response of a request
+            max_in_flight_requests: maximum number of requests sent and still awaiting their response.
+                Concurrent calls are pipelined over the single websocket up to this limit ; further
+                calls wait for a free slot before being sent.
+            max_pending_responses: maximum number of requests kept awaiting their response ;
+                the oldest one is evicted (and fails) beyond. Each request is also forgotten when its
+                timeout expires, so the store only fills when max_in_flight_requests is raised above it.
+            cache_device_states: True to keep in memory the last known state of each device, seeded by
+                `get_status_details` (and so `search_all_devices(with_state=True)`) and kept current by the
+                server side events. It is read with `get_cached_state` without any server call.
+            codec: the JSON codec used to decode and encode the websocket messages.
+                None means the fastest one installed (orjson, ujson or the stdlib json).
+            wire_tracing: True to log in the `dio_chacon_wifi_api.wire` logger the redacted frames,
+                HTTP exchanges and request round trip times. Off by default : nothing is formatted nor traced.
+            async_dispatch: True to deliver the server side events to the callbacks from background workers
+                instead of the websocket read loop, so that a slow callback does not delay the other messages.
+                The events of a device are delivered in order, those of different devices concurrently.
+            max_pending_events: with async_dispatch, maximum number of events waiting for delivery per device.
+            overflow_policy: with async_dispatch, what to do with a new event when the device queue is full :
+                drop the oldest event or coalesce the new one into the last pending one.
+            coalesce_window: delay in seconds to coalesce the bursts of shutter movement events of a device :
+                within the window only the latest state is delivered, a stop movement is always delivered
+                immediately. None means every event is delivered.
+            retry_policy: the delays between the background reconnection attempts of the websocket.
+                None means the default policy : fast first retry, jittered exponential backoff, unlimited attempts.
+            resync_on_reconnect: True to refresh the states of all the known devices after a reconnection and
+                notify the callbacks of the states missed while disconnected. With `cache_device_states`,
+                only the states that differ from the cached ones are notified ; without it, all the refreshed
+                states are. None (the default) means enabled only with `cache_device_states`.
+            max_outbox_size: maximum number of requests held while the websocket is reconnecting. They are
+                sent once the server confirms the reconnection, as are the requests left unanswered by the
+                lost connection, and still fail after their timeout. Beyond this limit, requests fail at once.
+            aiohttp_session: an HTTP session shared with other clients (for example one per account), so that
+                they share their connection pool, DNS cache and TLS sessions. The client does not close it.
+            connector: a connection pool shared with other clients, used when no aiohttp_session is given.
+                The client does not close it.
+            token_store: where the session tokens are kept (see `MemoryTokenStore` and `FileTokenStore`). When given,
+                the email and password are only sent to the HTTP login, once : the connections and reconnections,
+                including after a restart with a file store, reuse the stored token until the server rejects it.
+                The stored token is not logged out at disconnection, so that it stays reusable.
+            callback_inventory: the callback method called for each change of the devices inventory (see
+                `get_inventory`), with a dict of the device id, the action (added, updated or removed), the device
+                and its previous version. It can be a plain function or a coroutine function.
+            device_records: True to return and push the devices and their states as the compact `Device` and
+                `DeviceState` records of the records module, read and written like dicts but not JSON serializable
+                as is. False (the default) means plain dicts, converted from the records kept by the client.
         """
         self._login_email: str = login_email
         self._password: str = password
         self._session_token: str = session_token
         self._service_name: str = service_name
+        self._codec: JSONCodec = codec
+        self._wire_tracing: bool = wire_tracing
+        self._response_timeout: float = response_timeout
+        self._retry_policy: RetryPolicy = retry_policy
+        self._resync_on_reconnect: bool = cache_device_states if resync_on_reconnect is None else resync_on_reconnect
+        self._aiohttp_session: aiohttp.ClientSession | None = aiohttp_session
+        self._connector: aiohttp.BaseConnector | None = connector
+        self._token_store: TokenStore | None = token_store
+        self._resync_task: asyncio.Task | None = None
         self._callback_device_state: callable = callback_device_state
         self._callback_device_state_by_device: dict[str, callable] = {}
         self._device_types: dict[str, str] = {}
+        self._inventory: DeviceInventory = DeviceInventory()
+        self._callback_inventory: callable = callback_inventory
+        self._device_records: bool = device_records
+        self._topology: TopologyIndex = TopologyIndex()
+        # None until an extra link extractor is registered, meaning the default extractors.
+        self._link_extractors: dict[str, LinkExtractor] | None = None
+        self._state_cache: DeviceStateCache | None = DeviceStateCache() if cache_device_states else None
+        self._dispatcher: CallbackDispatcher | None = (
+            CallbackDispatcher(self._deliver_device_state, max_pending_events, overflow_policy)
+            if async_dispatch
+            else None
+        )
+        self._coalescer: EventCoalescer | None = (
+            EventCoalescer(coalesce_window, self._dispatch_device_state) if coalesce_window else None
+        )
+        # Keeps a reference on the coroutine callbacks scheduled without dispatcher until they are done.
+        self._callback_tasks: set[asyncio.Task] = set()
         self._session: DIOChaconClientSession | None = None
         # Unique message id for request / response correlation
         self._id: int = 0
         # Queue to await connection response from server
         self._messages_connection_queue: Queue = Queue()
-        # Queue to await responses for queries
-        self._messages_responses_queue: Queue = Queue()
-        # In case of server responses concurrency, uses this buffer to find correct message id response.
-        self._messages_buffer: dict = dict()
+        # True while the session creation awaits the connection response, False for the reconnections.
+        self._awaiting_connection: bool = False
+        # Futures awaiting the server response, keyed by the request id they correlate with.
+        self._pending_responses: PendingResponses = PendingResponses(max_pending_responses)
+        # Requests held while reconnecting, keyed by request id, sent once reconnected.
+        self._outbox: dict[int, dict] = dict()
+        self._max_outbox_size: int = max_outbox_size
+        # Requests sent and awaiting their response, keyed by request id, with the connection number used.
+        self._sent_messages: dict[int, tuple[dict, int]] = dict()
+        # Connection number of the session confirmed by the server connection success message.
+        self._ready_connection: int = 0
+        self._replay_task: asyncio.Task | None = None
+        # Limits the number of pipelined requests awaiting their response.
+        self._in_flight_semaphore: Semaphore = Semaphore(max_in_flight_requests)
         # Lock to prevent initialisation of WS connection concurrently
         self._init_lock: Lock = Lock()
         self._ws_url: str = DIOCHACON_WS_URL
+        self._metrics: ClientMetrics = ClientMetrics()
+        self._register_metrics()
 
     def set_callback_device_state(self, callback_device_state: callable) -> None:
         """Register after the constructor the global callback method that will be called for server side events"""
         self._callback_device_state = callback_device_state
 
+    def set_callback_inventory(self, callback_inventory: callable) -> None:
+        """Register after the constructor the callback method called for each change of the devices inventory"""
+        self._callback_inventory = callback_inventory
+
     def set_callback_device_state_by_device(self, target_id, callback_device_state: callable) -> None:
         """Register the per device callback method that will be called for server side events"""
         self._callback_device_state_by_device[target_id] = callback_device_state
 
+    def _register_metrics(self) -> None:
+        metrics = self._metrics
+        metrics.register_gauge("in_flight_requests", lambda: len(self._pending_responses))
+        metrics.register_gauge("held_requests", lambda: len(self._outbox))
+        metrics.register_counter("evicted_requests", lambda: self._pending_responses.evicted_count)
+        metrics.register_counter("orphaned_responses", lambda: self._pending_responses.orphaned_count)
+        if self._dispatcher:
+            metrics.register_counter("dispatch_dropped_events", lambda: self._dispatcher.dropped_count)
+            metrics.register_counter("dispatch_coalesced_events", lambda: self._dispatcher.coalesced_count)
+        if self._coalescer:
+            metrics.register_counter("coalesced_movement_events", lambda: self._coalescer.coalesced_count)
+
+    def _run_callback(self, callback: callable, data: dict) -> None:
+        """Calls the callback and, for a coroutine callback, schedules it without waiting for it."""
+        start = time.perf_counter()
+        result = callback(data)
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._callback_tasks.add(task)
+            # The duration of a coroutine callback is observed once its task is done.
+            task.add_done_callback(functools.partial(self._callback_task_done, start))
+        else:
+            self._metrics.callback_latency.observe(time.perf_counter() - start)
+
+    def _callback_task_done(self, start: float, task: asyncio.Task) -> None:
+        self._callback_tasks.discard(task)
+        self._metrics.callback_latency.observe(time.perf_counter() - start)
+        if not task.cancelled() and task.exception():
+            _LOGGER.error("Error in the device state callback", exc_info=task.exception())
+
+    async def _deliver_device_state(self, data: dict, device_only: bool = False) -> None:
+        """Delivers the device state to the global and device callbacks, awaiting the coroutine ones."""
+        global_callback = None if device_only else self._callback_device_state
+        for callback in (global_callback, self._callback_device_state_by_device.get(data["id"])):
+            if callback:
+                start = time.perf_counter()
+                result = callback(data)
+                if inspect.isawaitable(result):
+                    await result
+                self._metrics.callback_latency.observe(time.perf_counter() - start)
+
+    async def _deliver_device_state_to_device(self, data: dict) -> None:
+        await self._deliver_device_state(data, device_only=True)
+
+    def _notify_device_state(self, data: dict) -> None:
+        if self._coalescer and "movement" in data:
+            self._coalescer.push(data)
+        else:
+            self._dispatch_device_state(data)
+
+    def _dispatch_device_state(self, data: dict, device_only: bool = False) -> None:
+        """Sends the device state to the callbacks, through the dispatcher when enabled.
+
+        Parameters:
+            device_only: True to notify only the callback of the device, not the global one.
+        """
+        if self._dispatcher:
+            deliver = self._deliver_device_state_to_device if device_only else None
+            self._dispatcher.dispatch(data["id"], data, deliver)
+            return
+
+        if self._callback_device_state and not device_only:
+            _LOGGER.debug("Sending global callback event.")
+            self._run_callback(self._callback_device_state, data)
+
+        if data["id"] in self._callback_device_state_by_device:
+            _LOGGER.debug("Sending callback event for device %s", data["id"])
+            self._run_callback(self._callback_device_state_by_device[data["id"]], data)
+
     def _set_server_urls(self, ws_url: str) -> None:
         # Simple method to easily mock the server url.
         self._ws_url = ws_url
 
+    def _to_public(self, record: DeviceState | None) -> DeviceState | dict | None:
+        """Returns the stored record itself with `device_records`, else a plain dict of its keys."""
+        if record is None or self._device_records:
+            return record
+        return record.to_dict()
+
+    def _parsed_to_public(self, state: dict) -> DeviceState | dict:
+        """Returns a state parsed as a plain dict as a `DeviceState` record with `device_records`, else as is."""
+        return DeviceState(state) if self._device_records else state
+
+    def get_inventory(self) -> dict:
+        """Returns the devices of the account without any server call.
+
+        The inventory is loaded by `search_all_devices` (or `connect(prefetch_devices=True)`), then kept current
+        by the server events, for example when a device is renamed or moved to another room in the mobile app.
+
+        Returns:
+            A dict keyed by device id of devices with id, name, type, model and, when known, room_id and
+            room_name. With `device_records`, they are the `Device` records of the inventory and must not be modified.
+        """
+        devices = self._inventory.get_all()
+        if self._device_records:
+            return devices
+        return {device_id: device.to_dict() for device_id, device in devices.items()}
+
+    def _notify_inventory_change(self, change: dict) -> None:
+        _LOGGER.debug("Devices inventory change : %s %s", change["action"], change["id"])
+        if change["device"] is not None:
+            self._device_types[change["id"]] = change["device"].type
+        else:
+            self._device_types.pop(change["id"], None)
+        self._topology.invalidate_rooms()
+        if self._callback_inventory:
+            if not self._device_records:
+                change = {
+                    **change,
+                    "device": self._to_public(change["device"]),
+                    "previous": self._to_public(change["previous"]),
+                }
+            self._run_callback(self._callback_inventory, change)
+
+    def get_cached_state(self, device_id: str) -> dict | None:
+        """Returns the last known state of a device without any server call.
+
+        It requires the client to be created with `cache_device_states=True`.
+
+        Parameters:
+            device_id: the device id to get the state of.
+
+        Returns:
+            The state like the ones returned by `get_status_details` or pushed to the callbacks, None when the
+            state of the device is unknown or the cache is disabled. With `device_records`, it is the `DeviceState`
+            record of the cache and must not be modified : it is replaced at each new state of the device.
+        """
+        if self._state_cache is None:
+            return None
+        return self._to_public(self._state_cache.get(device_id))
+
+    def get_cached_states(self) -> dict:
+        """Returns a dict keyed by device id of all the last known states (see `get_cached_state`)."""
+        if self._state_cache is None:
+            return {}
+        states = self._state_cache.get_all()
+        if self._device_records:
+            return states
+        return {device_id: state.to_dict() for device_id, state in states.items()}
+
+    @property
+    def in_flight_requests(self) -> int:
+        """Number of requests sent to the server and still awaiting their response."""
+        return len(self._pending_responses)
+
+    @property
+    def evicted_requests_count(self) -> int:
+        """Number of requests evicted from the pending store because it was full."""
+        return self._pending_responses.evicted_count
+
+    @property
+    def orphaned_responses_count(self) -> int:
+        """Number of responses dropped because no request was awaiting them anymore (late replies)."""
+        return self._pending_responses.orphaned_count
+
+    @property
+    def metrics(self) -> ClientMetrics:
+        """Latency and throughput metrics of the client, exportable with `metrics.as_dict()` or
+        `metrics.as_prometheus()`."""
+        return self._metrics
+
     async def _get_or_init_session(self) -> None:
         if self._session and self._session.is_disconnected():
             _LOGGER.warning("You have been disconnected. Automatic reconnection...")
-            self._session = None
+            session, self._session = self._session, None
+            # Releases the resources of the stopped session.
+            await session.disconnect()
         if self._session is None:
             async with self._init_lock:
                 if self._session is None:
@@ -112,17 +385,26 @@ class DIOChaconAPIClient:
                         self._service_name,
                         self._message_received_callback,
                         self._session_token,
+                        self._codec,
+                        self._wire_tracing,
+                        self._retry_policy,
+                        self._aiohttp_session,
+                        self._connector,
+                        self._token_store,
+                        self._metrics,
                     )
                     # Stores session to be able to call disconnect whatever happens next (ok or ko auth)
                     self._session = session
                     session._set_server_urls(self._ws_url)
 
+                    self._awaiting_connection = True
                     await session.ws_connect()
 
                     # Wait for the reception of the connection success message from the server.
                     try:
                         connection_message = await asyncio.wait_for(self._messages_connection_queue.get(), 10)
                         self._messages_connection_queue.task_done()
+                        self._awaiting_connection = False
 
                         if (
                             "name" in connection_message
@@ -131,38 +413,54 @@ class DIOChaconAPIClient:
                         ):
                             _LOGGER.debug("Invalid auth response received : %s", connection_message)
                             raise DIOChaconInvalidAuthError("Invalid username/password.")
+                        if connection_message["action"] == "failed":
+                            raise DIOChaconAPIError(f"Connection failed : {connection_message['data']}")
                         # Do nothing of the connection successful message.
 
-                    except TimeoutError:
+                    except asyncio.TimeoutError:
+                        self._awaiting_connection = False
                         _LOGGER.error("Error connecting to the server !")
+                        await self._discard_session(session)
                         raise DIOChaconAPIError("No connection aknowledge message received from the server !")
+                    except (DIOChaconInvalidAuthError, DIOChaconAPIError):
+                        await self._discard_session(session)
+                        raise
+
+                    if self._outbox:
+                        # Concurrent calls made while connecting were held : they are sent now.
+                        await self._replay_outbox()
 
                     _LOGGER.debug("End of session creation via init_session")
 
-    @staticmethod
-    def _extract_links_state(links: list) -> dict:
+    async def _discard_session(self, session: DIOChaconClientSession) -> None:
+        """Closes a session whose connection failed, so that the next call connects again."""
+        self._session = None
+        await session.disconnect()
+
+    def register_link_extractor(self, rt: str, extractor: LinkExtractor) -> None:
+        """Registers the extractor of an extra link into the device states returned and pushed by this client.
+
+        The links without extractor are skipped, so an extra link only costs when its extractor is registered.
+        Ready-made extractors are `extract_quietmode` and `extract_shutter_calibration` of the links module.
+
+        Parameters:
+            rt: the rt of the link, for example `gw.r.quietmode`.
+            extractor: function called with the link and the state dict to set its keys in.
+        """
+        if self._link_extractors is None:
+            # The default extractors are shared by all the clients : they are copied at the first registration.
+            self._link_extractors = dict(DEFAULT_LINK_EXTRACTORS)
+        self._link_extractors[rt] = extractor
+
+    def _extract_links_state(self, links: list, state: dict = None) -> dict:
         """Maps the known device links coming from the server into flat state keys.
 
-        The returned dict carries a key only when the corresponding link is present
-        in the payload (and, for `last_event_image`, when the URL is also a safe
-        https URL per `_validated_image_url`). Consumers can therefore use `in`
-        to distinguish a missing value from a falsy one.
+        See `links.extract_links_state`, called with the extractors registered on this client. The returned
+        state carries a key only when the corresponding link is present in the payload (and, for
+        `last_event_image`, when the URL is also a safe https URL per `links._validated_image_url`).
+        Consumers can therefore use `in` to distinguish a missing value from a falsy one.
         """
-        state = {}
-        for link in links:
-            if link["rt"] == "oic.r.openlevel":
-                state["openlevel"] = link["openLevel"]
-            if link["rt"] == "oic.r.movement.linear":
-                state["movement"] = link["movement"]
-            if link["rt"] == "oic.r.switch.binary":
-                state["is_on"] = link["value"] == SwitchOnOffEnum.ON.value
-            if link["rt"] == "gw.r.lastEvent":
-                state["last_event_type"] = link["type"]
-                state["last_event_timestamp"] = link["ts"]
-                image = _validated_image_url(link.get("data", {}).get("image"))
-                if image is not None:
-                    state["last_event_image"] = image
-        return state
+        return extract_links_state(links, self._link_extractors, state)
 
     def _message_received_callback(self, data: Any) -> None:
         """The callback called whenever a server side message is received.
@@ -171,76 +469,138 @@ class DIOChaconAPIClient:
         """
 
         if "name" in data and data["name"] == "connection":
-            # Sends the connection message (success or invalid) in the dedicated queue
-            self._messages_connection_queue.put_nowait(data)
+            if data["action"] == "success" and self._session:
+                self._ready_connection = self._session.connection_number
+            if self._awaiting_connection:
+                # Sends the connection message (success or invalid) in the dedicated queue
+                self._messages_connection_queue.put_nowait(data)
+            elif data["action"] == "success":
+                _LOGGER.info("Reconnected to the server.")
+                self._replay_task = asyncio.create_task(self._replay_outbox())
+                if self._resync_on_reconnect and self._device_types:
+                    if self._resync_task:
+                        # The states refreshed by a previous connection are outdated.
+                        self._resync_task.cancel()
+                    self._resync_task = asyncio.create_task(self._resync_device_states())
+            else:
+                _LOGGER.error("Reconnection refused by the server : %s", data)
             return
 
         if "id" in data:
-            # Sends the response message which has the same id has the request
-            self._messages_responses_queue.put_nowait(data)
+            # Resolves the request waiting for the response which has the same id
+            self._resolve_message_response(data)
+            return
+
+        if "name" in data and data["name"] == "device" and data["action"] == "update":
+            # A device description changed, for example renamed from the mobile app.
+            change = self._inventory.apply_update(data["data"])
+            if change:
+                self._notify_inventory_change(change)
             return
 
         if "name" in data and data["name"] == "deviceState" and data["action"] == "update":
             # Sends the device state pushed from the server to the calling client
             # Sends only pertinent data :
-            result = {}
             device_data = data["data"]
-            result["id"] = device_data["di"]
-            result["type"] = self._device_types.get(result["id"])
-            result["connected"] = device_data["rc"] == 1
-            result.update(self._extract_links_state(device_data["links"]))
+            device_id = device_data["di"]
+            # Parsed as a plain dict : the cache copies it into its record.
+            result = {"id": device_id, "type": self._device_types.get(device_id), "connected": device_data["rc"] == 1}
+            self._extract_links_state(device_data["links"], result)
 
-            sent = False
+            handled = False
 
-            if self._callback_device_state:
-                _LOGGER.debug("Sending global callback event.")
-                self._callback_device_state(result)
-                sent = True
+            if self._state_cache is not None:
+                self._state_cache.update(device_id, result)
+                handled = True
 
-            if result["id"] in self._callback_device_state_by_device:
-                _LOGGER.debug("Sending callback event for device %s", result["id"])
-                self._callback_device_state_by_device[result["id"]](result)
-                sent = True
+            if self._callback_device_state or device_id in self._callback_device_state_by_device:
+                self._notify_device_state(self._parsed_to_public(result))
+                handled = True
 
-            if sent:
+            if handled:
                 return
 
         _LOGGER.warning("Unknown message received and dropped / no callback registered for this message : %s", data)
 
+    async def _resync_device_states(self) -> None:
+        """Refreshes the states of all the known devices and notifies the ones that changed."""
+        device_ids = list(self._device_types)
+        previous_states = {}
+        if self._state_cache is not None:
+            # The cached records are replaced, not modified, by the refresh.
+            previous_states = {
+                device_id: state for device_id in device_ids if (state := self._state_cache.get(device_id)) is not None
+            }
+
+        try:
+            states = await self.get_status_details(device_ids)
+        except DIOChaconAPIError as error:
+            _LOGGER.warning("Devices states resynchronisation after reconnection failed : %s", error)
+            return
+
+        for device_id, state in states.items():
+            state["type"] = self._device_types.get(device_id)
+            previous_state = previous_states.get(device_id)
+            if previous_state is not None and all(
+                previous_state.get(key) == value for key, value in state.items() if key != "type"
+            ):
+                continue
+            _LOGGER.debug("State of device %s changed while disconnected", device_id)
+            self._notify_device_state(state)
+
+    def _is_ready(self) -> bool:
+        """True when the websocket is open and its connection is confirmed by the server."""
+        return self._session.is_connected() and self._session.connection_number == self._ready_connection
+
+    async def _send_or_hold(self, msg: dict) -> None:
+        """Sends the request when connected, holds it in the outbox while reconnecting."""
+        if self._is_ready():
+            try:
+                await self._session.ws_send_message(msg)
+                self._sent_messages[msg["id"]] = (msg, self._ready_connection)
+                return
+            except (ConnectionError, aiohttp.ClientError) as error:
+                _LOGGER.warning("Request id %s not sent, the connection is lost : %s", msg["id"], error)
+
+        if len(self._outbox) >= self._max_outbox_size:
+            raise DIOChaconAPIError("Not connected to the server and too many requests already waiting !")
+        _LOGGER.debug("Request id %s held until reconnection", msg["id"])
+        self._outbox[msg["id"]] = msg
+
+    async def _replay_outbox(self) -> None:
+        """Sends the requests held while reconnecting and those left unanswered by the lost connection.
+
+        The device actions being set points (position, on or off), sending again an action that the server
+        may have received before the connection loss is harmless.
+        """
+        messages = list(self._outbox.values())
+        self._outbox.clear()
+        messages.extend(msg for msg, connection in self._sent_messages.values() if connection != self._ready_connection)
+        for msg in sorted(messages, key=lambda msg: msg["id"]):
+            if msg["id"] in self._pending_responses:
+                _LOGGER.debug("Replaying request id %s after reconnection", msg["id"])
+                try:
+                    await self._send_or_hold(msg)
+                except DIOChaconAPIError as error:
+                    _LOGGER.warning("Request id %s dropped : %s", msg["id"], error)
+
     def _get_next_id(self) -> int:
         self._id = self._id + 1
         return self._id
 
-    async def _consume_message_queue_and_cache_it(self) -> None:
-        while not self._messages_responses_queue.empty():
-            data = await self._messages_responses_queue.get()
-            msg_id: int = int(data["id"])
-            cached = self._messages_buffer.get(msg_id)
-            if not cached:
-                self._messages_buffer[msg_id] = data
-            self._messages_responses_queue.task_done()
-
-    async def _get_message_response_with_id(self, message_id: int) -> Any:
-        await self._consume_message_queue_and_cache_it()
-        cached = self._messages_buffer.get(message_id)
-        # Try another after a small sleep
-        if not cached:
-            await asyncio.sleep(0.5)
-            await self._consume_message_queue_and_cache_it()
-
-        cached = self._messages_buffer.get(message_id)
-        if not cached:
-            _LOGGER.error("No response received for message id : %s", message_id)
-            raise DIOChaconAPIError("Unexpected situation : no response with correct id !")
-
-        # Remove value from cache has it is considered as consumed
-        self._messages_buffer.pop(message_id)
+    def _resolve_message_response(self, data: Any) -> None:
+        msg_id: int = int(data["id"])
+        if not self._pending_responses.resolve(msg_id, data):
+            _LOGGER.warning("Response received for an unknown or expired message id : %s", msg_id)
 
-        _LOGGER.debug("Messages buffer in memory cached size = %s", len(self._messages_buffer))
-
-        return cached
+    async def _get_message_response_with_id(self, message_id: int, future: asyncio.Future, timeout: float) -> Any:
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            _LOGGER.error("No response received for message id : %s", message_id)
+            raise DIOChaconAPIError(f"No response received from the server within {timeout}s !")
 
-    async def _send_ws_message(self, method: str, path: str, parameters: Any) -> Any:
+    async def _send_ws_message(self, method: str, path: str, parameters: Any, timeout: float = None) -> Any:
         req_id = self._get_next_id()
 
         # Constructs the message that will be formated in JSON by the DIOChaconClientSession object
@@ -250,107 +610,216 @@ class DIOChaconAPIClient:
         msg["parameters"] = parameters
         msg["id"] = req_id
 
-        _LOGGER.debug("WS request to send = %s", msg)
         await self._get_or_init_session()
-        await self._session.ws_send_message(msg)
-
-        raw_results = await self._get_message_response_with_id(req_id)
 
-        _LOGGER.debug("WS response with result : %s", raw_results)
+        if timeout is None:
+            timeout = self._response_timeout
+        async with self._in_flight_semaphore:
+            # The future is registered before sending so that a very fast response cannot be missed.
+            future = asyncio.get_running_loop().create_future()
+            self._pending_responses.add(req_id, future)
+            start = time.perf_counter()
+            try:
+                await self._send_or_hold(msg)
+                raw_results = await self._get_message_response_with_id(req_id, future, timeout)
+            except DIOChaconAPIError:
+                self._metrics.observe_request(path, time.perf_counter() - start, success=False)
+                raise
+            finally:
+                self._pending_responses.discard(req_id)
+                self._outbox.pop(req_id, None)
+                self._sent_messages.pop(req_id, None)
+
+        elapsed = time.perf_counter() - start
+        self._metrics.observe_request(path, elapsed, success=raw_results["status"] == 200)
+        if self._wire_tracing:
+            WIRE_LOGGER.debug(
+                "ws response id=%s path=%s status=%s rtt_ms=%.1f",
+                req_id,
+                path,
+                raw_results["status"],
+                elapsed * 1000,
+            )
 
         if raw_results["status"] != 200:
             raise DIOChaconAPIError(f"Error during API call : {raw_results}")
 
         return raw_results
 
-    async def disconnect(self) -> None:
+    async def connect(self, prefetch_devices: bool = False) -> None:
+        """Opens and authenticates the connection to the cloud server now rather than at the first call.
+
+        It is also called when the client is used as an async context manager (`async with`).
+
+        Parameters:
+            prefetch_devices: True to also retrieve all the devices with their states, so that the device types
+                are known for the server side events and, with `cache_device_states`, the states are cached.
+
+        Raises:
+            DIOChaconInvalidAuthError: when the credentials are rejected.
+            DIOChaconAPIError: when the connection or the prefetch failed. The connection is then closed :
+                no reconnection is left running in background.
+        """
+        try:
+            await self._get_or_init_session()
+            if prefetch_devices:
+                await self.search_all_devices(with_state=True)
+        except Exception:
+            # Nobody disconnects a client that failed to connect, even with `async with`.
+            await self.disconnect()
+            raise
+
+    async def __aenter__(self) -> "DIOChaconAPIClient":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.disconnect()
+
+    async def disconnect(self, timeout: float = DEFAULT_DISCONNECT_TIMEOUT) -> None:
         """Disconnects for the cloud server and properly closes the connection.
         It must be called at the of API usage or before python program ending.
+        When authenticated with a session token, the session is logged out first.
+        The requests still awaiting their response fail with a DIOChaconAPIError.
+
+        Parameters:
+            timeout: maximum delay in seconds for the logout and for the end of the websocket listening.
         """
+        if self._resync_task:
+            self._resync_task.cancel()
+        if self._replay_task:
+            self._replay_task.cancel()
         if self._session:
+            if self._session_token and self._is_ready():
+                # The server closes the websocket after the logout : it must not be reopened.
+                self._session.prepare_disconnect()
+                try:
+                    await self._send_ws_message("POST", "/session/logout", {}, timeout)
+                except DIOChaconAPIError as error:
+                    _LOGGER.warning("Logout failed : %s", error)
+            # The requests still awaiting a response fail now rather than at the end of their timeout.
+            self._pending_responses.fail_all("client disconnected")
+            self._outbox.clear()
+            self._sent_messages.clear()
             # Close the web socket
-            await self._session.disconnect()
+            await self._session.disconnect(timeout)
+        if self._coalescer:
+            self._coalescer.close()
+        if self._dispatcher:
+            await self._dispatcher.close()
 
-    async def get_user_id(self) -> str:
+    async def get_user_id(self, timeout: float = None) -> str:
         """Search for the user technical id based on its authentification elements.
 
+        Parameters:
+            timeout: delay in seconds to wait for the server response. None means the client default.
+
         Returns:
             A string for the unique user id from the server.
         """
 
-        raw_results = await self._send_ws_message("GET", "/user", {})
+        raw_results = await self._send_ws_message("GET", "/user", {}, timeout)
 
         return raw_results["data"]["id"]
 
     async def search_all_devices(
-        self, device_type_to_search: list[DeviceTypeEnum] = None, with_state: bool = False
+        self, device_type_to_search: list[DeviceTypeEnum] = None, with_state: bool = False, timeout: float = None
     ) -> dict:
         """Search all the known devices with their states : positions for shutters and on/off for switches
 
         Parameters:
             device_type_to_search: the device type to search for. None means to return all type (SHUTTERS and SWITCHES)
             with_state: True to return the detailed states like shutter position and switches on or off.
+            timeout: delay in seconds to wait for each server response. None means the client default.
 
         Returns:
-            A dict keyed by device id, with id, name, type, model and (when with_state is True)
-            connected plus the device-specific state keys: openlevel and movement for shutters,
-            is_on for switches, last_event_type / last_event_timestamp / last_event_image for
-            doorbells. State keys are present only when the underlying link carries a value,
-            so `last_event_image` is absent when the doorbell has no camera or the URL is unsafe.
+            A dict keyed by device id of dicts (`Device` records with `device_records`), with id, name,
+            type, model and (when with_state is True) connected plus the device-specific state keys:
+            openlevel and movement for shutters, is_on for switches, last_event_type /
+            last_event_timestamp / last_event_image for doorbells. State keys are present only when the
+            underlying link carries a value, so `last_event_image` is absent when the doorbell has no camera
+            or the URL is unsafe.
         """
 
-        raw_results = await self._send_ws_message("GET", "/device", {})
+        raw_results = await self._send_ws_message("GET", "/device", {}, timeout)
+
+        devices = [device for device in map(device_from_dio_api, raw_results["data"]) if device is not None]
+        for change in self._inventory.load(devices):
+            self._notify_inventory_change(change)
+        self._topology.invalidate_rooms()
 
         results = dict()
         ids = []
-        for device in raw_results["data"]:
-            result = {}
-            id = device["id"]
-            type = device["type"]
-            device_type = DeviceTypeEnum.from_dio_api(type)
-            if device_type is not DeviceTypeEnum.UNKNOWN and (
-                not device_type_to_search or (device_type in device_type_to_search)
-            ):
+        for device in devices:
+            id = device.id
+            self._device_types[id] = device.type
+            if not device_type_to_search or DeviceTypeEnum(device.type) in device_type_to_search:
                 ids.append(id)
-                result["id"] = id
-                result["name"] = device["name"]
-                result["type"] = device_type.value  # Converts type to our constant definition
-                result["model"] = device["modelName"] + "_" + device["softwareVersion"]
-                results[id] = result
-                self._device_types[id] = device_type.value
+                # A copy, the states are added to the result and not to the inventory.
+                results[id] = device.copy() if self._device_records else device.to_dict()
 
         if with_state:
-            details = await self.get_status_details(ids, device_infos=results)
+            details = await self.get_status_details(ids, device_infos=results, timeout=timeout)
             for id in ids:
                 if id in details:
                     results[id].update(details[id])
 
         return results
 
-    async def get_status_details(self, ids: list, notifyCallback: bool = False, device_infos: dict = None) -> dict:
+    async def get_status_details(
+        self,
+        ids: list,
+        notifyCallback: bool = False,
+        device_infos: dict = None,
+        timeout: float = None,
+        max_age: float = None,
+    ) -> dict:
         """Retrieves the status detailed of devices ids given.
 
         Parameters:
             ids: the device ids to search details for.
-            notifyCallback: True to notify the callback function par device.
+            notifyCallback: True to notify the callback function par device of the states received from the server.
             device_infos: the devices infos (name and model) for requested ids. Used only to produce a log.
+            timeout: delay in seconds to wait for the server response. None means the client default.
+            max_age: when the client caches the device states (`cache_device_states=True`), the devices
+                whose state was received less than max_age seconds ago are answered from the cache
+                and only the other ones are requested to the server. None means all are requested.
 
         Returns:
-            A dict keyed by device id, with id, connected and the device-specific state keys:
-            openlevel and movement for shutters, is_on for switches, last_event_type /
-            last_event_timestamp / last_event_image for doorbells. State keys are present
-            only when the underlying link carries a value, so `last_event_image` is absent
-            when the doorbell has no camera or the URL is unsafe.
+            A dict keyed by device id of dicts (`DeviceState` records with `device_records`), with id,
+            connected and the device-specific state keys: openlevel and movement for shutters,
+            is_on for switches, last_event_type / last_event_timestamp / last_event_image for doorbells.
+            State keys are present only when the underlying link carries a value, so `last_event_image`
+            is absent when the doorbell has no camera or the URL is unsafe.
         """
 
-        parameters = {"devices": ids}
-        raw_results = await self._send_ws_message("POST", "/device/states", parameters)
-
         results = dict()
+        if max_age is not None and self._state_cache is not None:
+            ids_to_fetch = []
+            for device_id in ids:
+                state = self._state_cache.get_fresh(device_id, max_age)
+                if state is None:
+                    ids_to_fetch.append(device_id)
+                else:
+                    state = state.copy() if self._device_records else state.to_dict()
+                    # The pushed states also carry the device type : removed to return the keys of the fetched ones.
+                    state.pop("type", None)
+                    results[device_id] = state
+                    if notifyCallback and device_id in self._callback_device_state_by_device:
+                        _LOGGER.debug("Sending callback cached status details for device %s", device_id)
+                        self._dispatch_device_state(state, device_only=True)
+            if not ids_to_fetch:
+                return results
+        else:
+            ids_to_fetch = ids
+
+        parameters = {"devices": ids_to_fetch}
+        raw_results = await self._send_ws_message("POST", "/device/states", parameters, timeout)
+
         for device_key in raw_results["data"]:
             device_data = raw_results["data"][device_key]
-            result = {}
-            result["id"] = device_key
+            # Parsed as a plain dict : the cache copies it into its record.
+            result = {"id": device_key}
 
             if device_data is None:
                 # The server sends no data on the device but it exists (e.g with a very old firmware),
@@ -376,45 +845,192 @@ class DIOChaconAPIClient:
             else:
                 # Nominal case
                 result["connected"] = device_data["rc"] == 1
-                result.update(self._extract_links_state(device_data["links"]))
+                self._extract_links_state(device_data["links"], result)
+
+            if self._state_cache is not None:
+                self._state_cache.update(device_key, result)
 
+            result = self._parsed_to_public(result)
             results[device_key] = result
 
             # Send the update via the callback by device.
             if notifyCallback and device_key in self._callback_device_state_by_device:
                 _LOGGER.debug("Sending callback status details for device %s", device_key)
-                self._callback_device_state_by_device[device_key](result)
+                self._dispatch_device_state(result, device_only=True)
 
         return results
 
-    async def move_shutter_direction(self, shutter_id: str, direction: ShutterMoveEnum) -> None:
+    async def move_shutter_direction(self, shutter_id: str, direction: ShutterMoveEnum, timeout: float = None) -> None:
         """Moves the given shutter in the given direction.
 
         Parameters:
             shutter_id: the device id defining the chosen shutter.
             direction: up, down or stop movement.
+            timeout: delay in seconds to wait for the server acknowledge. None means the client default.
         """
 
         parameters = {"movement": direction.value.lower()}
-        await self._send_ws_message("POST", f"/device/{shutter_id}/action/mvtlinear", parameters)
+        await self._send_ws_message("POST", f"/device/{shutter_id}/action/mvtlinear", parameters, timeout)
 
-    async def move_shutter_percentage(self, shutter_id: str, openlevel: int) -> None:
+    async def move_shutter_percentage(self, shutter_id: str, openlevel: int, timeout: float = None) -> None:
         """Moves the given shutter at a given position.
 
         Parameters:
             shutter_id: the device id defining the chosen shutter.
             openlevel: the open level percentage between 0 and 100.
+            timeout: delay in seconds to wait for the server acknowledge. None means the client default.
         """
         parameters = {"openLevel": openlevel}
-        await self._send_ws_message("POST", f"/device/{shutter_id}/action/openlevel", parameters)
+        await self._send_ws_message("POST", f"/device/{shutter_id}/action/openlevel", parameters, timeout)
 
-    async def switch_switch(self, switch_id: str, set_on: bool) -> None:
+    async def switch_switch(self, switch_id: str, set_on: bool, timeout: float = None) -> None:
         """Switches on or off the given switch.
 
         Parameters:
             switch_id: the device id defining the chosen switch.
             set_on: on or off as desired state.
+            timeout: delay in seconds to wait for the server acknowledge. None means the client default.
         """
         val = SwitchOnOffEnum.ON.value if set_on else SwitchOnOffEnum.OFF.value
         parameters = {"value": val}
-        await self._send_ws_message("POST", f"/device/{switch_id}/action/switch", parameters)
+        await self._send_ws_message("POST", f"/device/{switch_id}/action/switch", parameters, timeout)
+
+    async def execute_batch(self, actions: dict[str, tuple[str, dict]], timeout: float = None) -> dict:
+        """Executes one action per device, all requests being sent back to back and acknowledged concurrently.
+
+        A slow or failing device does not delay nor fail the actions of the other devices.
+
+        Parameters:
+            actions: a dict keyed by device id of (action, parameters) tuples, action being the last element
+                of the action path (for example ("openlevel", {"openLevel": 75}) or ("switch", {"value": 1})).
+            timeout: delay in seconds to wait for each server acknowledge. None means the client default.
+
+        Returns:
+            A dict keyed by device id, with None when the action is acknowledged by the server
+            or the exception raised for this device otherwise.
+        """
+        device_ids = list(actions)
+        results = await asyncio.gather(
+            *[
+                self._send_ws_message("POST", f"/device/{device_id}/action/{action}", parameters, timeout)
+                for device_id, (action, parameters) in actions.items()
+            ],
+            return_exceptions=True,
+        )
+        return {
+            device_id: result if isinstance(result, BaseException) else None
+            for device_id, result in zip(device_ids, results)
+        }
+
+    async def move_shutters(self, openlevels: dict[str, int], timeout: float = None) -> dict:
+        """Moves several shutters at once, each one at its given position.
+
+        Parameters:
+            openlevels: a dict keyed by shutter device id of the open level percentage between 0 and 100.
+            timeout: delay in seconds to wait for each server acknowledge. None means the client default.
+
+        Returns:
+            A dict keyed by shutter id, with None when the move is acknowledged or the exception raised otherwise.
+        """
+        actions = {shutter_id: ("openlevel", {"openLevel": openlevel}) for shutter_id, openlevel in openlevels.items()}
+        return await self.execute_batch(actions, timeout)
+
+    async def switch_switches(self, states: dict[str, bool], timeout: float = None) -> dict:
+        """Switches on or off several switches at once.
+
+        Parameters:
+            states: a dict keyed by switch device id of the desired state, True for on and False for off.
+            timeout: delay in seconds to wait for each server acknowledge. None means the client default.
+
+        Returns:
+            A dict keyed by switch id, with None when the switch is acknowledged or the exception raised otherwise.
+        """
+        actions = {
+            switch_id: ("switch", {"value": SwitchOnOffEnum.ON.value if set_on else SwitchOnOffEnum.OFF.value})
+            for switch_id, set_on in states.items()
+        }
+        return await self.execute_batch(actions, timeout)
+
+    async def _load_rooms(self, timeout: float = None) -> None:
+        raw_results = await self._send_ws_message("GET", "/room", {}, timeout)
+        self._topology.load_rooms(raw_results["data"])
+
+    async def _load_groups(self, timeout: float = None) -> None:
+        raw_results = await self._send_ws_message("GET", "/group", {}, timeout)
+        self._topology.load_groups(raw_results["data"])
+
+    async def get_rooms(self, refresh: bool = False, timeout: float = None) -> dict:
+        """Returns the rooms of the account with their devices.
+
+        The rooms are retrieved from the server at the first call only (with the devices when they were not
+        searched yet), then the cached ones are returned with their devices kept current by the inventory events.
+
+        Parameters:
+            refresh: True to retrieve the rooms from the server again.
+            timeout: delay in seconds to wait for each server response. None means the client default.
+
+        Returns:
+            A dict keyed by room id of dicts with id, name and devices : the ids of the supported devices
+            of the room. They must not be modified.
+        """
+        loads = []
+        if self._topology.rooms is None or refresh:
+            loads.append(self._load_rooms(timeout))
+        if not self._inventory.loaded:
+            loads.append(self.search_all_devices(timeout=timeout))
+        await asyncio.gather(*loads)
+        self._topology.index_rooms(self._inventory.get_all())
+        return dict(self._topology.rooms)
+
+    async def get_groups(self, refresh: bool = False, timeout: float = None) -> dict:
+        """Returns the groups of devices of the account, retrieved from the server at the first call only.
+
+        Parameters:
+            refresh: True to retrieve the groups from the server again.
+            timeout: delay in seconds to wait for the server response. None means the client default.
+
+        Returns:
+            A dict keyed by group id of dicts with id, name and devices : the ids of the devices of the group.
+            They must not be modified.
+        """
+        if self._topology.groups is None or refresh:
+            await self._load_groups(timeout)
+        return dict(self._topology.groups)
+
+    def _devices_of_types(self, device_ids: list[str], device_types: tuple[DeviceTypeEnum, ...]) -> list[str]:
+        type_values = [device_type.value for device_type in device_types]
+        return [device_id for device_id in device_ids if self._device_types.get(device_id) in type_values]
+
+    async def move_room_shutters(self, room: str, openlevel: int, timeout: float = None) -> dict:
+        """Moves all the shutters of a room at once to the given position.
+
+        Parameters:
+            room: the id or the name of the room.
+            openlevel: open level percentage between 0 and 100.
+            timeout: delay in seconds to wait for each server response. None means the client default.
+
+        Returns:
+            A dict keyed by shutter id, with None when the move is acknowledged or the exception raised otherwise.
+        """
+        room_entry = TopologyIndex.find(await self.get_rooms(timeout=timeout), room)
+        shutter_ids = self._devices_of_types(room_entry["devices"], (DeviceTypeEnum.SHUTTER,))
+        return await self.move_shutters({shutter_id: openlevel for shutter_id in shutter_ids}, timeout)
+
+    async def switch_group(self, group: str, set_on: bool, timeout: float = None) -> dict:
+        """Switches on or off all the switches of a group at once.
+
+        Parameters:
+            group: the id or the name of the group.
+            set_on: True to switch on, False to switch off.
+            timeout: delay in seconds to wait for each server response. None means the client default.
+
+        Returns:
+            A dict keyed by switch id, with None when the switch is acknowledged or the exception raised otherwise.
+        """
+        group_entry = TopologyIndex.find(await self.get_groups(timeout=timeout), group)
+        if not self._inventory.loaded:
+            await self.search_all_devices(timeout=timeout)
+        switch_ids = self._devices_of_types(
+            group_entry["devices"], (DeviceTypeEnum.SWITCH_LIGHT, DeviceTypeEnum.SWITCH_PLUG)
+        )
+        return await self.switch_switches({switch_id: set_on for switch_id in switch_ids}, timeout)
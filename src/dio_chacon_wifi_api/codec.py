@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""JSON codecs used to decode and encode the websocket messages."""
+import json
+import logging
+from typing import Any
+from typing import Callable
+from typing import NamedTuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class JSONCodec(NamedTuple):
+    """Pair of functions converting websocket text payloads from and to python objects.
+
+    Attributes:
+        loads: converts a JSON string to a python object.
+        dumps: converts a python object to a JSON string (a str, not bytes).
+        name: label of the codec used in logs.
+    """
+
+    loads: Callable[[str], Any]
+    dumps: Callable[[Any], str]
+    name: str = "custom"
+
+
+STDLIB_JSON_CODEC = JSONCodec(json.loads, json.dumps, "json")
+
+
+def get_default_codec() -> JSONCodec:
+    """Returns the fastest codec available : orjson, then ujson when installed, else the stdlib json."""
+    try:
+        import orjson
+
+        return JSONCodec(orjson.loads, lambda obj: orjson.dumps(obj).decode(), "orjson")
+    except ImportError:
+        pass
+    try:
+        import ujson
+
+        return JSONCodec(ujson.loads, ujson.dumps, "ujson")
+    except ImportError:
+        pass
+    return STDLIB_JSON_CODEC
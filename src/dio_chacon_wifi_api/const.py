@@ -1,31 +1,47 @@
 # -*- coding: utf-8 -*-
 """Consts for Dio Chacon wifi python client API."""
 from enum import Enum
+from functools import lru_cache
 
 DIOCHACON_WS_URL = "wss://l4hfront-prod.chacon.cloud/ws"
+DIOCHACON_LOGIN_URL = "https://l4hfront-prod.chacon.cloud/api/session/login"
+
+# Default delay in seconds to wait for the server response of a websocket request.
+DEFAULT_RESPONSE_TIMEOUT = 10
+
+# Default maximum number of requests pipelined in the websocket while awaiting their response.
+DEFAULT_MAX_IN_FLIGHT_REQUESTS = 64
+
+# Default maximum size of the store of requests awaiting their response.
+DEFAULT_MAX_PENDING_RESPONSES = 256
+
+# Default maximum number of server side events waiting for their callbacks delivery, per device.
+DEFAULT_MAX_PENDING_EVENTS = 100
+
+# Default websocket reconnection policy : first delay and maximum delay in seconds, ratio of random jitter.
+DEFAULT_RETRY_FIRST_DELAY = 1
+DEFAULT_RETRY_MAX_DELAY = 60
+DEFAULT_RETRY_JITTER = 0.5
+
+# Default maximum number of requests held while reconnecting, to be sent once reconnected.
+DEFAULT_MAX_OUTBOX_SIZE = 32
+
+# Default maximum delay in seconds for the logout and the termination of the websocket listening at disconnection.
+DEFAULT_DISCONNECT_TIMEOUT = 2
+
+# Default account pool connection pacing : maximum concurrent handshakes and delay in seconds between two connections.
+DEFAULT_POOL_MAX_CONCURRENT_CONNECTIONS = 10
+DEFAULT_POOL_CONNECT_INTERVAL = 0.02
 
 
 class DeviceTypeEnum(Enum):
 
     @staticmethod
     def from_dio_api(label: str):
-        dict_array = [
-            {'label': ".wifi.shutter.", 'code': "SHUTTER"},
-            {'label': ".wifi.genericSwitch.", 'code': "SWITCH_LIGHT"},
-            {'label': ".wifi.plug.", 'code': "SWITCH_PLUG"},
-            {'label': ".wifi.doorBell.", 'code': "DOORBELL"},
-        ]
-        for d in dict_array:
-            if d['label'] in label:
-                return DeviceTypeEnum(d['code'])
-        return DeviceTypeEnum.UNKNOWN
+        return _device_type_from_dio_api(label)
 
     def equals(self, other_label: str) -> bool:
-        if DeviceTypeEnum.from_dio_api(other_label) == self:
-            return True
-        if other_label in [e.value for e in DeviceTypeEnum]:
-            return True
-        return False
+        return _device_type_from_dio_api(other_label) == self or other_label in _DEVICE_TYPE_VALUES
 
     SHUTTER = "SHUTTER"
     SWITCH_LIGHT = "SWITCH_LIGHT"
@@ -34,6 +50,25 @@ class DeviceTypeEnum(Enum):
     UNKNOWN = "UNKNOWN"
 
 
+# Substrings of the DIO API device types, checked in this order : the first one found gives the device type.
+_DIO_API_TYPE_LABELS = (
+    (".wifi.shutter.", DeviceTypeEnum.SHUTTER),
+    (".wifi.genericSwitch.", DeviceTypeEnum.SWITCH_LIGHT),
+    (".wifi.plug.", DeviceTypeEnum.SWITCH_PLUG),
+    (".wifi.doorBell.", DeviceTypeEnum.DOORBELL),
+)
+_DEVICE_TYPE_VALUES = frozenset(member.value for member in DeviceTypeEnum)
+
+
+@lru_cache(maxsize=256)
+def _device_type_from_dio_api(label: str) -> DeviceTypeEnum:
+    # The few distinct type labels of an installation are classified once, then served from the cache.
+    for substring, device_type in _DIO_API_TYPE_LABELS:
+        if substring in label:
+            return device_type
+    return DeviceTypeEnum.UNKNOWN
+
+
 class ShutterMoveEnum(Enum):
     UP = "up"
     STOP = "stop"
@@ -43,3 +78,8 @@ class ShutterMoveEnum(Enum):
 class SwitchOnOffEnum(Enum):
     ON = 1
     OFF = 0
+
+
+class DispatchOverflowEnum(Enum):
+    DROP_OLDEST = "drop_oldest"
+    COALESCE = "coalesce"
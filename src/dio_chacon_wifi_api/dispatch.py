@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""Dispatch of the server side device events to the callbacks, outside of the websocket read loop."""
+import asyncio
+import logging
+from collections import deque
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+
+from .const import DispatchOverflowEnum
+from .const import ShutterMoveEnum
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CallbackDispatcher:
+    """Bounded per device queues of events delivered by background workers.
+
+    The events of a same device are delivered in their reception order, one at a time, while the events
+    of different devices are delivered concurrently. Each device queue holds at most `max_pending_events`
+    events : beyond, the overflow policy either drops the oldest event or coalesces the new event
+    into the last pending one.
+    """
+
+    def __init__(
+        self,
+        deliver: Callable[[dict], Awaitable[Any]],
+        max_pending_events: int,
+        overflow_policy: DispatchOverflowEnum = DispatchOverflowEnum.DROP_OLDEST,
+    ) -> None:
+        """Initialize the dispatcher.
+
+        Parameters:
+            deliver: the coroutine function delivering one event to the callbacks.
+            max_pending_events: maximum number of events waiting for delivery per device.
+            overflow_policy: what to do with a new event when the device queue is full.
+        """
+        self._deliver = deliver
+        self._max_pending_events: int = max_pending_events
+        self._overflow_policy: DispatchOverflowEnum = overflow_policy
+        self._queues: dict[str, deque] = dict()
+        self._workers: dict[str, asyncio.Task] = dict()
+        self.dropped_count: int = 0
+        self.coalesced_count: int = 0
+
+    @property
+    def pending_events(self) -> int:
+        """Number of events waiting for their delivery, all devices included."""
+        return sum(len(queue) for queue in self._queues.values())
+
+    def dispatch(self, device_id: str, event: dict, deliver: Callable[[dict], Awaitable[Any]] = None) -> None:
+        """Queues the event of the device for delivery without waiting for it.
+
+        Parameters:
+            deliver: the coroutine function delivering this event, instead of the dispatcher one.
+        """
+        queue = self._queues.get(device_id)
+        if queue is None:
+            queue = self._queues[device_id] = deque()
+        deliver = deliver or self._deliver
+
+        if len(queue) >= self._max_pending_events:
+            if self._overflow_policy is DispatchOverflowEnum.COALESCE and queue[-1][1] == deliver:
+                # Merged into a copy of the pending event, which keeps its type (a record or a dict).
+                merged = queue[-1][0].copy()
+                merged.update(event)
+                queue[-1] = (merged, deliver)
+                self.coalesced_count += 1
+                return
+            queue.popleft()
+            self.dropped_count += 1
+            _LOGGER.warning("Too many pending events for device %s, the oldest one is dropped.", device_id)
+        queue.append((event, deliver))
+
+        if device_id not in self._workers:
+            self._workers[device_id] = asyncio.get_running_loop().create_task(self._run(device_id))
+
+    async def _run(self, device_id: str) -> None:
+        queue = self._queues[device_id]
+        try:
+            while queue:
+                event, deliver = queue.popleft()
+                try:
+                    await deliver(event)
+                except Exception:
+                    _LOGGER.exception("Error in the callback of device %s", device_id)
+        finally:
+            self._workers.pop(device_id, None)
+            if not queue:
+                self._queues.pop(device_id, None)
+
+    async def join(self) -> None:
+        """Waits for the delivery of all the pending events."""
+        while self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+    async def close(self) -> None:
+        """Cancels the delivery of the pending events."""
+        workers = list(self._workers.values())
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._queues.clear()
+
+
+class EventCoalescer:
+    """Throttles the bursts of events of each device within a coalescing window.
+
+    The first event of a device is emitted immediately and opens the window. The events received
+    during the window replace each other and only the latest one is emitted at the end of the window,
+    which opens a new one. An event whose movement is stop is always emitted immediately and closes
+    the window, superseding the pending event.
+    """
+
+    def __init__(self, window: float, emit: Callable[[dict], None]) -> None:
+        """Initialize the coalescer.
+
+        Parameters:
+            window: duration of the coalescing window in seconds.
+            emit: the function called with each event to deliver.
+        """
+        self._window: float = window
+        self._emit = emit
+        self._pending: dict[str, dict] = dict()
+        self._timers: dict[str, asyncio.TimerHandle] = dict()
+        self.coalesced_count: int = 0
+
+    def push(self, event: dict) -> None:
+        """Emits the event of the device now or at the end of the current window."""
+        device_id = event["id"]
+        if event.get("movement") == ShutterMoveEnum.STOP.value:
+            self._close_window(device_id)
+            self._emit(event)
+            return
+
+        if device_id in self._timers:
+            if device_id in self._pending:
+                self.coalesced_count += 1
+            self._pending[device_id] = event
+            return
+
+        self._emit(event)
+        self._open_window(device_id)
+
+    def _open_window(self, device_id: str) -> None:
+        self._timers[device_id] = asyncio.get_running_loop().call_later(self._window, self._end_window, device_id)
+
+    def _close_window(self, device_id: str) -> None:
+        timer = self._timers.pop(device_id, None)
+        if timer:
+            timer.cancel()
+        if self._pending.pop(device_id, None) is not None:
+            self.coalesced_count += 1
+
+    def _end_window(self, device_id: str) -> None:
+        self._timers.pop(device_id, None)
+        event = self._pending.pop(device_id, None)
+        if event is not None:
+            self._emit(event)
+            self._open_window(device_id)
+
+    def close(self) -> None:
+        """Cancels the windows in progress, dropping their pending events."""
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        self._pending.clear()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""In memory inventory of the devices of the account, kept current by the server `device` events."""
+from .const import DeviceTypeEnum
+from .records import Device
+
+
+def device_from_dio_api(raw_device: dict) -> Device | None:
+    """Builds the record of a device from its description sent by the server.
+
+    Returns:
+        The device with id, name, type, model and, when known, room_id and room_name.
+        None when the device type is not supported by this library.
+    """
+    device_type = DeviceTypeEnum.from_dio_api(raw_device["type"])
+    if device_type is DeviceTypeEnum.UNKNOWN:
+        return None
+    device = Device()
+    device.id = raw_device["id"]
+    device.name = raw_device["name"]
+    device.type = device_type.value  # Converts type to our constant definition
+    device.model = raw_device["modelName"] + "_" + raw_device["softwareVersion"]
+    if raw_device.get("roomId") is not None:
+        device.room_id = raw_device["roomId"]
+    if raw_device.get("roomName") is not None:
+        device.room_name = raw_device["roomName"]
+    return device
+
+
+class DeviceInventory:
+    """Description (name, type, model, room) of each supported device of the account, keyed by device id.
+
+    It is loaded by the full devices listing, then updated incrementally by the `device` / `update` events
+    sent by the server, for example when a device is renamed in the mobile app. Each change is returned
+    as a dict with the device id, the action (added, updated or removed), the device and its previous version.
+    """
+
+    def __init__(self) -> None:
+        self._devices: dict[str, Device] = dict()
+        self.loaded: bool = False
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._devices
+
+    def get(self, device_id: str) -> Device | None:
+        """Returns the device or None when unknown. The record must not be modified."""
+        return self._devices.get(device_id)
+
+    def get_all(self) -> dict[str, Device]:
+        """Returns a new dict keyed by device id of all the devices."""
+        return dict(self._devices)
+
+    def load(self, devices: list[Device]) -> list[dict]:
+        """Replaces the inventory by the full devices listing.
+
+        Returns:
+            The changes compared to the previous listing, none for the first one.
+        """
+        changes = []
+        remaining_ids = set(self._devices)
+        for device in devices:
+            remaining_ids.discard(device.id)
+            change = self._store(device)
+            if change:
+                changes.append(change)
+        for device_id in remaining_ids:
+            changes.append(
+                {"id": device_id, "action": "removed", "device": None, "previous": self._devices.pop(device_id)}
+            )
+
+        first_load = not self.loaded
+        self.loaded = True
+        return [] if first_load else changes
+
+    def apply_update(self, raw_device: dict) -> dict | None:
+        """Applies a device description pushed by the server.
+
+        Returns:
+            The change, None when nothing changed or the device type is not supported.
+        """
+        device = device_from_dio_api(raw_device)
+        if device is None:
+            return None
+        return self._store(device)
+
+    def _store(self, device: Device) -> dict | None:
+        previous = self._devices.get(device.id)
+        if previous is None:
+            self._devices[device.id] = device
+            return {"id": device.id, "action": "added", "device": device, "previous": None}
+        if "room_name" not in device and "room_name" in previous and device.room_id == previous.room_id:
+            # The listing describes the room by its id only : the name received before is kept.
+            device.room_name = previous.room_name
+        if previous == device:
+            return None
+        snapshot = previous.copy()
+        previous.replace(device)
+        return {"id": device.id, "action": "updated", "device": previous, "previous": snapshot}
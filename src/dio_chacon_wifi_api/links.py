@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Extraction of the device states from the links of the devices sent by the server."""
+from types import MappingProxyType
+from typing import Any
+from typing import Callable
+from typing import Mapping
+from typing import MutableMapping
+from urllib.parse import urlsplit
+
+from .const import SwitchOnOffEnum
+
+# Function setting in the state (second argument) the keys extracted from a link (first argument).
+LinkExtractor = Callable[[dict, dict], None]
+
+_SWITCH_ON = SwitchOnOffEnum.ON.value
+
+
+def _validated_image_url(url: Any) -> str | None:
+    """Returns the image URL only when its scheme is https and it carries no embedded credentials.
+
+    The helper guards against the most common mis-parses of a raw URL string
+    (non-https scheme, scheme written in mixed case, URL with userinfo). It
+    does not validate the host or the network reachability of the URL.
+    Consumers are still expected to apply their own policy before fetching
+    or rendering the URL.
+    """
+    if not isinstance(url, str):
+        return None
+    parsed = urlsplit(url)
+    if parsed.scheme.lower() != "https":
+        return None
+    if not parsed.hostname:
+        return None
+    if parsed.username or parsed.password:
+        return None
+    return url
+
+
+def _extract_openlevel(link: dict, state: dict) -> None:
+    state["openlevel"] = link["openLevel"]
+
+
+def _extract_movement(link: dict, state: dict) -> None:
+    state["movement"] = link["movement"]
+
+
+def _extract_switch(link: dict, state: dict) -> None:
+    state["is_on"] = link["value"] == _SWITCH_ON
+
+
+def _extract_last_event(link: dict, state: dict) -> None:
+    state["last_event_type"] = link["type"]
+    state["last_event_timestamp"] = link["ts"]
+    image = _validated_image_url(link.get("data", {}).get("image"))
+    if image is not None:
+        state["last_event_image"] = image
+
+
+def extract_quietmode(link: dict, state: dict) -> None:
+    """Extractor of the `gw.r.quietmode` link into the `quiet_mode` boolean key. Not registered by default."""
+    state["quiet_mode"] = link["value"] == 1
+
+
+def extract_shutter_calibration(link: dict, state: dict) -> None:
+    """Extractor of the `gw.r.shutter.calibration` link into the `calibration_up_ms` and `calibration_down_ms`
+    keys, the full travel durations of the shutter. Not registered by default."""
+    state["calibration_up_ms"] = link["up_ms"]
+    state["calibration_down_ms"] = link["down_ms"]
+
+
+_DEFAULT_LINK_EXTRACTORS: dict[str, LinkExtractor] = {
+    "oic.r.openlevel": _extract_openlevel,
+    "oic.r.movement.linear": _extract_movement,
+    "oic.r.switch.binary": _extract_switch,
+    "gw.r.lastEvent": _extract_last_event,
+}
+# The extractors of the links of the states returned by default, keyed by link rt. Read only view.
+DEFAULT_LINK_EXTRACTORS: Mapping[str, LinkExtractor] = MappingProxyType(_DEFAULT_LINK_EXTRACTORS)
+
+
+def extract_links_state(
+    links: list, extractors: Mapping[str, LinkExtractor] = None, state: MutableMapping = None
+) -> MutableMapping:
+    """Maps the device links coming from the server into flat state keys, in a single pass.
+
+    Each link is handed to the extractor registered for its rt, the links without extractor
+    (schedules, pairing...) are skipped with a single lookup.
+
+    Parameters:
+        links: the links of a device.
+        extractors: the extractors keyed by link rt. None means the default ones.
+        state: the state to set the keys in. None means a new dict.
+
+    Returns:
+        The state with the keys extracted.
+    """
+    if state is None:
+        state = {}
+    # A plain dict lookup is faster than through the read only view.
+    get_extractor = (extractors or _DEFAULT_LINK_EXTRACTORS).get
+    for link in links:
+        extractor = get_extractor(link["rt"])
+        if extractor is not None:
+            extractor(link, state)
+    return state
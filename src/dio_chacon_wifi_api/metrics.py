@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Latency and throughput metrics of a client, exportable as a dict or as Prometheus text."""
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable
+
+# Upper bounds in seconds of the latency histograms buckets, the last bucket being unbounded.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_PROMETHEUS_PREFIX = "dio_chacon"
+
+
+def _escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@lru_cache(maxsize=1024)
+def normalize_path(path: str) -> str:
+    """Replaces the device id of a request path by a placeholder, so that all the devices share the same metrics.
+
+    For example `/device/L4HActuator_xxx/action/openlevel` becomes `/device/{id}/action/openlevel`.
+    """
+    parts = path.split("/")
+    if len(parts) > 3 and parts[1] == "device":
+        parts[2] = "{id}"
+        return "/".join(parts)
+    return path
+
+
+class LatencyHistogram:
+    """Counts of durations by bucket, with their count and sum."""
+
+    __slots__ = ("bucket_counts", "count", "sum", "errors")
+
+    def __init__(self) -> None:
+        self.bucket_counts: list[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.errors: int = 0
+
+    def observe(self, seconds: float) -> None:
+        self.bucket_counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def cumulative_buckets(self) -> list[tuple[str, int]]:
+        """Returns the (upper bound, count of durations lower or equal) pairs, ending with +Inf."""
+        buckets = []
+        total = 0
+        for bound, count in zip((*LATENCY_BUCKETS, float("inf")), self.bucket_counts):
+            total += count
+            buckets.append(("+Inf" if bound == float("inf") else str(bound), total))
+        return buckets
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum_seconds": self.sum,
+            "errors": self.errors,
+            "buckets": dict(self.cumulative_buckets()),
+        }
+
+
+class ClientMetrics:
+    """Metrics of a client : round trip times per request path, received frames, callbacks duration and
+    connection losses. The values owned by the other components (in flight requests...) are read at export.
+
+    Recording a value is a few additions, so the metrics are always on.
+    """
+
+    def __init__(self) -> None:
+        self.request_latencies: dict[str, LatencyHistogram] = dict()
+        self.callback_latency: LatencyHistogram = LatencyHistogram()
+        self.frames_received: int = 0
+        self.bytes_received: int = 0
+        self.connections: int = 0
+        self.reconnections: int = 0
+        self.disconnected_seconds: float = 0.0
+        self._disconnected_since: float | None = None
+        # Name, function returning the current value and Prometheus type of the values owned by other components.
+        self._external_values: dict[str, tuple[Callable[[], float], str]] = dict()
+
+    def register_gauge(self, name: str, read: Callable[[], float]) -> None:
+        """Adds a value read at each export, for example the number of requests awaiting their response."""
+        self._external_values[name] = (read, "gauge")
+
+    def register_counter(self, name: str, read: Callable[[], int]) -> None:
+        """Adds a counter owned by another component, read at each export, for example the evicted requests."""
+        self._external_values[name] = (read, "counter")
+
+    def observe_request(self, path: str, seconds: float, success: bool = True) -> None:
+        """Records the round trip time of a request, or its failure (timeout or error status)."""
+        key = normalize_path(path)
+        histogram = self.request_latencies.get(key)
+        if histogram is None:
+            histogram = self.request_latencies[key] = LatencyHistogram()
+        if success:
+            histogram.observe(seconds)
+        else:
+            histogram.errors += 1
+
+    def observe_frame(self, size: int) -> None:
+        """Records a received frame of `size` bytes."""
+        self.frames_received += 1
+        self.bytes_received += size
+
+    def on_connected(self) -> None:
+        self.connections += 1
+        if self._disconnected_since is not None:
+            # Connected again after a connection loss.
+            self.reconnections += 1
+            self.disconnected_seconds += time.monotonic() - self._disconnected_since
+            self._disconnected_since = None
+
+    def on_connection_lost(self) -> None:
+        if self._disconnected_since is None:
+            self._disconnected_since = time.monotonic()
+
+    def on_stopped(self) -> None:
+        """The connection is closed on purpose : the time until the next connection is not a disconnection."""
+        if self._disconnected_since is not None:
+            self.disconnected_seconds += time.monotonic() - self._disconnected_since
+            self._disconnected_since = None
+
+    def _current_disconnected_seconds(self) -> float:
+        if self._disconnected_since is None:
+            return self.disconnected_seconds
+        return self.disconnected_seconds + time.monotonic() - self._disconnected_since
+
+    def as_dict(self) -> dict:
+        """Exports the metrics as a plain dict.
+
+        Only counters are exported, as in `as_prometheus` : the rates are computed by the consumer between two
+        of its exports, so that several consumers do not disturb each other.
+        """
+        return {
+            "requests": {path: histogram.as_dict() for path, histogram in self.request_latencies.items()},
+            "callbacks": self.callback_latency.as_dict(),
+            "frames_received": self.frames_received,
+            "bytes_received": self.bytes_received,
+            "connections": self.connections,
+            "reconnections": self.reconnections,
+            "disconnected_seconds": self._current_disconnected_seconds(),
+            **{name: read() for name, (read, _) in self._external_values.items()},
+        }
+
+    def as_prometheus(self, labels: dict[str, str] = None) -> str:
+        """Exports the metrics in the Prometheus text exposition format.
+
+        Parameters:
+            labels: labels added to all the samples, for example the account of the client.
+        """
+
+        def format_labels(extra: dict[str, str] = None) -> str:
+            all_labels = {**(labels or {}), **(extra or {})}
+            if not all_labels:
+                return ""
+            return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in all_labels.items()) + "}"
+
+        lines = []
+
+        def add_histogram(name: str, histograms: dict[str, LatencyHistogram], label_name: str = None) -> None:
+            lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_{name} histogram")
+            for label_value, histogram in histograms.items():
+                series_labels = {label_name: label_value} if label_name else {}
+                for bound, count in histogram.cumulative_buckets():
+                    bucket_labels = format_labels({**series_labels, "le": bound})
+                    lines.append(f"{_PROMETHEUS_PREFIX}_{name}_bucket{bucket_labels} {count}")
+                lines.append(f"{_PROMETHEUS_PREFIX}_{name}_sum{format_labels(series_labels)} {histogram.sum}")
+                lines.append(f"{_PROMETHEUS_PREFIX}_{name}_count{format_labels(series_labels)} {histogram.count}")
+
+        def add_sample(name: str, metric_type: str, value: float) -> None:
+            lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_{name} {metric_type}")
+            lines.append(f"{_PROMETHEUS_PREFIX}_{name}{format_labels()} {value}")
+
+        add_histogram("request_duration_seconds", self.request_latencies, "path")
+        lines.append(f"# TYPE {_PROMETHEUS_PREFIX}_request_errors_total counter")
+        for path, histogram in self.request_latencies.items():
+            lines.append(f"{_PROMETHEUS_PREFIX}_request_errors_total{format_labels({'path': path})} {histogram.errors}")
+        add_histogram("callback_duration_seconds", {"": self.callback_latency})
+        add_sample("frames_received_total", "counter", self.frames_received)
+        add_sample("bytes_received_total", "counter", self.bytes_received)
+        add_sample("connections_total", "counter", self.connections)
+        add_sample("reconnections_total", "counter", self.reconnections)
+        add_sample("disconnected_seconds_total", "counter", self._current_disconnected_seconds())
+        for name, (read, metric_type) in self._external_values.items():
+            add_sample(f"{name}_total" if metric_type == "counter" else name, metric_type, read())
+        return "\n".join(lines) + "\n"
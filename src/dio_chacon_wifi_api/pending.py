@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Bounded store of the requests awaiting their websocket response."""
+import logging
+from asyncio import Future
+from typing import Any
+
+from .exceptions import DIOChaconAPIError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class PendingResponses:
+    """Futures awaiting a server response, keyed by request id.
+
+    The lifetime of an entry is bounded by the timeout of its request : the caller discards it once answered
+    or timed out. The store also holds at most `max_size` entries : beyond, the oldest entry is evicted and
+    its future fails with a DIOChaconAPIError. Responses received for an unknown, timed out or already answered
+    request are counted as orphaned and dropped, so late replies never stay in memory.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self._max_size: int = max_size
+        # Insertion ordered so that the first entry is always the oldest one.
+        self._entries: dict[int, Future] = dict()
+        self.evicted_count: int = 0
+        self.orphaned_count: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, msg_id: int) -> bool:
+        return msg_id in self._entries
+
+    def add(self, msg_id: int, future: Future) -> None:
+        """Registers the future awaiting the response of the request `msg_id`."""
+        while len(self._entries) >= self._max_size:
+            oldest_id = next(iter(self._entries))
+            self._evict(oldest_id, "too many requests awaiting a response")
+        self._entries[msg_id] = future
+
+    def resolve(self, msg_id: int, data: Any) -> bool:
+        """Sets the response on the future of the request `msg_id`.
+
+        Returns:
+            True when a request was awaiting this response, False when the response is orphaned.
+        """
+        future = self._entries.pop(msg_id, None)
+        if future is None or future.done():
+            self.orphaned_count += 1
+            return False
+        future.set_result(data)
+        return True
+
+    def discard(self, msg_id: int) -> None:
+        """Forgets the request `msg_id`, answered or not."""
+        self._entries.pop(msg_id, None)
+
+    def fail_all(self, reason: str) -> None:
+        """Fails the futures of all the requests awaiting a response, for example at disconnection."""
+        entries, self._entries = self._entries, dict()
+        for msg_id, future in entries.items():
+            if not future.done():
+                future.set_exception(DIOChaconAPIError(f"Request {msg_id} failed : {reason}"))
+
+    def _evict(self, msg_id: int, reason: str) -> None:
+        future = self._entries.pop(msg_id)
+        self.evicted_count += 1
+        _LOGGER.warning("Request id %s evicted : %s", msg_id, reason)
+        if not future.done():
+            future.set_exception(DIOChaconAPIError(f"Request {msg_id} evicted : {reason}"))
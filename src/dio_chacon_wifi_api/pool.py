@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Pool of DIO Chacon clients for many accounts sharing one event loop."""
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Any
+
+import aiohttp
+
+from .client import DIOChaconAPIClient
+from .const import DEFAULT_POOL_CONNECT_INTERVAL
+from .const import DEFAULT_POOL_MAX_CONCURRENT_CONNECTIONS
+from .exceptions import DIOChaconAPIError
+from .exceptions import DIOChaconInvalidAuthError
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _AccountHealth:
+    """Counters of an account, kept small since there is one per account."""
+
+    __slots__ = ("last_error", "last_connected_at", "last_event_at", "events_count")
+
+    def __init__(self) -> None:
+        self.last_error: Exception | None = None
+        self.last_connected_at: float | None = None
+        self.last_event_at: float | None = None
+        self.events_count: int = 0
+
+
+class DIOChaconAccountPool:
+    """Manages the clients of many accounts (up to a thousand) in a single event loop.
+
+    All the clients share one aiohttp session, so one connection pool, DNS cache and TLS session cache.
+    Their connections are staggered and the number of concurrent handshakes is limited to avoid
+    a thundering herd on the cloud server at startup. The server side events of all the accounts are
+    routed to a single callback along with the account id, and the health of each account is reported
+    by `get_health`.
+
+    The memory used per account is mostly the websocket of its client. Keep it low with the client options
+    given to the pool : no state cache (the default), and small `max_pending_responses`, `max_outbox_size`
+    and `max_pending_events` bounds.
+    """
+
+    def __init__(
+        self,
+        callback_device_state: callable = None,
+        max_concurrent_connections: int = DEFAULT_POOL_MAX_CONCURRENT_CONNECTIONS,
+        connect_interval: float = DEFAULT_POOL_CONNECT_INTERVAL,
+        aiohttp_session: aiohttp.ClientSession = None,
+        **client_options: Any,
+    ) -> None:
+        """Initialize the pool. Actually do nothing but storing informations.
+
+        Parameters:
+            callback_device_state: the callback method called for the server side events of all the accounts,
+                with the account id and the event data as arguments. It can be a coroutine function.
+            max_concurrent_connections: maximum number of connection handshakes in progress at once.
+            connect_interval: delay in seconds between the start of two account connections.
+            aiohttp_session: the HTTP session shared by all the clients. None means the pool creates
+                (and closes) its own one. Its connector must allow a connection per account (`limit=0`).
+            client_options: other parameters given to every `DIOChaconAPIClient` created by the pool.
+        """
+        self._callback_device_state: callable = callback_device_state
+        self._connect_interval: float = connect_interval
+        self._handshake_semaphore: asyncio.Semaphore = asyncio.Semaphore(max_concurrent_connections)
+        self._aiohttp_session: aiohttp.ClientSession | None = aiohttp_session
+        self._owns_aiohttp_session: bool = aiohttp_session is None
+        self._client_options: dict = client_options
+        self._clients: dict[str, DIOChaconAPIClient] = dict()
+        self._health: dict[str, _AccountHealth] = dict()
+        self._ws_url: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _set_server_urls(self, ws_url: str) -> None:
+        # Simple method to easily mock the server url of all the clients.
+        self._ws_url = ws_url
+        for client in self._clients.values():
+            client._set_server_urls(ws_url)
+
+    def add_account(
+        self, account_id: str, login_email: str = None, password: str = None, session_token: str = None, **options
+    ) -> DIOChaconAPIClient:
+        """Creates the client of an account. It is connected by `connect_all` or at its first call.
+
+        Parameters:
+            account_id: arbitrary unique id of the account, given to the callback with its events.
+            login_email: string containing the account email in DIO app
+            password: string containing the account password in DIO app
+            session_token: token obtained from the HTTP login, used instead of the email and password
+            options: parameters of this client overriding the pool client options.
+
+        Returns:
+            The client of the account.
+        """
+        if account_id in self._clients:
+            raise DIOChaconAPIError(f"Account {account_id} already in the pool !")
+        if self._aiohttp_session is None:
+            # Each websocket keeps its connection : the default limit of 100 connections would block the next ones.
+            self._aiohttp_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+
+        client = DIOChaconAPIClient(
+            login_email,
+            password,
+            callback_device_state=partial(self._on_device_state, account_id),
+            session_token=session_token,
+            aiohttp_session=self._aiohttp_session,
+            **{**self._client_options, **options},
+        )
+        if self._ws_url:
+            client._set_server_urls(self._ws_url)
+        self._clients[account_id] = client
+        self._health[account_id] = _AccountHealth()
+        return client
+
+    def get_client(self, account_id: str) -> DIOChaconAPIClient:
+        """Returns the client of the account."""
+        return self._clients[account_id]
+
+    async def remove_account(self, account_id: str) -> None:
+        """Disconnects the client of the account and removes it from the pool."""
+        client = self._clients.pop(account_id)
+        self._health.pop(account_id)
+        await client.disconnect()
+
+    def _on_device_state(self, account_id: str, data: dict) -> Any:
+        health = self._health.get(account_id)
+        if health is not None:
+            health.events_count += 1
+            health.last_event_at = time.time()
+        if self._callback_device_state:
+            return self._callback_device_state(account_id, data)
+
+    async def _connect_account(self, account_id: str, delay: float, prefetch_devices: bool) -> Exception | None:
+        await asyncio.sleep(delay)
+        client = self._clients.get(account_id)
+        if client is None:
+            return None
+        health = self._health[account_id]
+        async with self._handshake_semaphore:
+            try:
+                await client.connect(prefetch_devices=prefetch_devices)
+            except (DIOChaconAPIError, DIOChaconInvalidAuthError) as error:
+                _LOGGER.warning("Connection of account %s failed : %s", account_id, error)
+                health.last_error = error
+                return error
+        health.last_error = None
+        health.last_connected_at = time.time()
+        return None
+
+    async def connect_all(self, prefetch_devices: bool = False) -> dict:
+        """Connects all the accounts of the pool, staggered and with a limited number of concurrent handshakes.
+
+        Parameters:
+            prefetch_devices: True to also retrieve the devices and their states of each account.
+
+        Returns:
+            A dict keyed by account id, with None when connected or the exception raised otherwise.
+        """
+        account_ids = list(self._clients)
+        results = await asyncio.gather(
+            *[
+                self._connect_account(account_id, index * self._connect_interval, prefetch_devices)
+                for index, account_id in enumerate(account_ids)
+            ]
+        )
+        return dict(zip(account_ids, results))
+
+    def get_health(self) -> dict:
+        """Returns the health of each account.
+
+        Returns:
+            A dict keyed by account id of dicts with : state (idle, connected, reconnecting or stopped),
+            connection_number, in_flight_requests, events_count, last_event_at, last_connected_at (epoch
+            seconds or None) and last_error (the message of the last connection error or None).
+        """
+        report = dict()
+        for account_id, client in self._clients.items():
+            health = self._health[account_id]
+            session = client._session
+            if session is None:
+                # A failed connection leaves no session.
+                state = "stopped" if health.last_error else "idle"
+            elif client._is_ready():
+                # Connected only once the server accepted the credentials.
+                state = "connected"
+            elif session.is_disconnected():
+                state = "stopped"
+            else:
+                state = "reconnecting"
+            report[account_id] = {
+                "state": state,
+                "connection_number": session.connection_number if session else 0,
+                "in_flight_requests": client.in_flight_requests,
+                "events_count": health.events_count,
+                "last_event_at": health.last_event_at,
+                "last_connected_at": health.last_connected_at,
+                "last_error": str(health.last_error) if health.last_error else None,
+            }
+        return report
+
+    async def disconnect_all(self) -> None:
+        """Disconnects all the accounts and closes the shared HTTP session when owned by the pool."""
+        await asyncio.gather(*[client.disconnect() for client in self._clients.values()], return_exceptions=True)
+        if self._aiohttp_session and self._owns_aiohttp_session:
+            await self._aiohttp_session.close()
+            self._aiohttp_session = None
+
+    async def __aenter__(self) -> "DIOChaconAccountPool":
+        await self.connect_all()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.disconnect_all()
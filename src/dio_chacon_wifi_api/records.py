@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Compact records of the devices and of their states, readable and writable like the dicts they replace."""
+from collections.abc import Mapping
+from collections.abc import MutableMapping
+from typing import Any
+from typing import Iterator
+
+# Marks the keys absent from the values of `replace`.
+_UNSET = object()
+
+
+class _SlottedRecord(MutableMapping):
+    """Record storing its known keys in slots instead of a per instance dict.
+
+    It behaves as a dict of the keys set : `record["openlevel"]`, `"openlevel" in record`, `record.get(...)`,
+    `record.update(...)`, `dict(record)` and the comparison with a dict work as before. A key is absent
+    while its slot is unset, so that the presence of a key keeps its meaning. The attributes are also typed
+    accessors : `record.openlevel` is None when the key is absent. Keys without slot (for example from the
+    registered link extractors) are kept in a small dict allocated on first use only.
+    """
+
+    __slots__ = ("_extra",)
+
+    # Names and slot descriptors of the known keys, set for each subclass.
+    _slot_descriptors: dict = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._slot_descriptors = {
+            name: klass.__dict__[name]
+            for klass in reversed(cls.__mro__)
+            for name in klass.__dict__.get("__slots__", ())
+            if not name.startswith("_")
+        }
+
+    def __init__(self, values: Any = None, /, **kwargs: Any) -> None:
+        self._extra: dict | None = None
+        if values:
+            self._assign(values if hasattr(values, "keys") else dict(values))
+        if kwargs:
+            self._assign(kwargs)
+
+    def _assign(self, values: Mapping) -> None:
+        # Sets the slots directly, without the per key overhead of __setitem__.
+        descriptors = self._slot_descriptors
+        if values.keys() <= descriptors.keys():
+            # Only slotted keys, the most common case : set as attributes, without any lookup.
+            for key, value in values.items():
+                setattr(self, key, value)
+            return
+        for key, value in values.items():
+            descriptor = descriptors.get(key)
+            if descriptor is not None:
+                descriptor.__set__(self, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[key] = value
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for the unset slots : the absent keys read as None.
+        if name in self._slot_descriptors:
+            return None
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+    def __getitem__(self, key: str) -> Any:
+        descriptor = self._slot_descriptors.get(key)
+        if descriptor is not None:
+            try:
+                return descriptor.__get__(self)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        descriptor = self._slot_descriptors.get(key)
+        if descriptor is not None:
+            descriptor.__set__(self, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key: str) -> None:
+        descriptor = self._slot_descriptors.get(key)
+        if descriptor is not None:
+            try:
+                descriptor.__delete__(self)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __contains__(self, key: object) -> bool:
+        try:
+            self[key]
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_dict())
+
+    def __len__(self) -> int:
+        return len(self.to_dict())
+
+    def __reduce__(self) -> tuple:
+        # The default reduce of the slots would read the unset ones as None through __getattr__.
+        return (type(self), (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def to_dict(self) -> dict:
+        """Returns a plain dict of the keys set, faster than `dict(record)` which reads them one by one."""
+        result = {}
+        for name, descriptor in self._slot_descriptors.items():
+            try:
+                result[name] = descriptor.__get__(self)
+            except AttributeError:
+                pass
+        if self._extra:
+            result.update(self._extra)
+        return result
+
+    def update(self, values: Any = None, /, **kwargs: Any) -> None:
+        if values:
+            self._assign(values if hasattr(values, "keys") else dict(values))
+        if kwargs:
+            self._assign(kwargs)
+
+    def clear(self) -> None:
+        for descriptor in self._slot_descriptors.values():
+            # Set before the deletion, which raises for an unset slot : cheaper than catching it.
+            descriptor.__set__(self, None)
+            descriptor.__delete__(self)
+        self._extra = None
+
+    def copy(self) -> "_SlottedRecord":
+        return type(self)(self.to_dict())
+
+    def replace(self, values: Mapping) -> None:
+        """Replaces in place all the keys of the record by the ones of `values`."""
+        descriptors = self._slot_descriptors
+        # A single pass on the slots, each one being set or cleared, then the extra keys if any.
+        nb_slots_set = 0
+        for name, descriptor in descriptors.items():
+            value = values.get(name, _UNSET)
+            if value is _UNSET:
+                # Set before the deletion, which raises for an unset slot : cheaper than catching it.
+                descriptor.__set__(self, None)
+                descriptor.__delete__(self)
+            else:
+                descriptor.__set__(self, value)
+                nb_slots_set += 1
+        self._extra = None
+        if nb_slots_set < len(values):
+            self._assign({key: value for key, value in values.items() if key not in descriptors})
+
+
+class DeviceState(_SlottedRecord):
+    """State of a device as returned by `get_status_details` and pushed to the callbacks.
+
+    Keys : id, type, connected and the device-specific ones, present only when known : openlevel and
+    movement for shutters, is_on for switches, last_event_type / last_event_timestamp / last_event_image
+    for doorbells.
+    """
+
+    __slots__ = (
+        "id",
+        "type",
+        "connected",
+        "openlevel",
+        "movement",
+        "is_on",
+        "last_event_type",
+        "last_event_timestamp",
+        "last_event_image",
+    )
+
+
+class Device(DeviceState):
+    """Device as returned by `search_all_devices` : id, name, type, model and, when known, room_id and room_name,
+    with its state keys when requested."""
+
+    __slots__ = ("name", "model", "room_id", "room_name")
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Reconnection retry policy of the websocket session."""
+import random
+
+from .const import DEFAULT_RETRY_FIRST_DELAY
+from .const import DEFAULT_RETRY_JITTER
+from .const import DEFAULT_RETRY_MAX_DELAY
+
+
+class RetryPolicy:
+    """Exponential backoff with jitter between the reconnection attempts of the websocket.
+
+    The first retry happens after `first_delay` seconds, each next one after `multiplier` times the previous
+    delay, capped at `max_delay`. Each delay is randomly reduced by up to `jitter` (a ratio between 0 and 1)
+    so that many clients disconnected at once do not reconnect at the same time.
+    Subclass it and override `get_delay` for a custom policy.
+    """
+
+    def __init__(
+        self,
+        first_delay: float = DEFAULT_RETRY_FIRST_DELAY,
+        max_delay: float = DEFAULT_RETRY_MAX_DELAY,
+        multiplier: float = 2,
+        jitter: float = DEFAULT_RETRY_JITTER,
+        max_attempts: int | None = None,
+    ) -> None:
+        """Initialize the policy.
+
+        Parameters:
+            first_delay: delay in seconds before the first retry.
+            max_delay: maximum delay in seconds between two retries.
+            multiplier: factor applied to the delay after each failed retry.
+            jitter: maximum ratio of the delay randomly removed from it.
+            max_attempts: number of failed retries after which the session gives up. None means unlimited.
+        """
+        self.first_delay: float = first_delay
+        self.max_delay: float = max_delay
+        self.multiplier: float = multiplier
+        self.jitter: float = jitter
+        self.max_attempts: int | None = max_attempts
+
+    def get_delay(self, attempt: int) -> float | None:
+        """Returns the delay in seconds before the retry number `attempt` (starting at 1), None to give up."""
+        if self.max_attempts is not None and attempt > self.max_attempts:
+            return None
+        delay = min(self.first_delay * self.multiplier ** (attempt - 1), self.max_delay)
+        return delay * (1 - self.jitter * random.random())
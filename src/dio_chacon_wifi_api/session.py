@@ -4,16 +4,25 @@ And context between the various websockets calls.
 Largely inspired by https://github.com/jjlawren/python-plexwebsocket/blob/master/plexwebsocket.py
 """
 import asyncio
-import json
 import logging
 import urllib
 
 import aiohttp
-
+from yarl import URL
+
+from .auth import fetch_session_token
+from .auth import TokenStore
+from .codec import get_default_codec
+from .codec import JSONCodec
+from .const import DEFAULT_DISCONNECT_TIMEOUT
+from .const import DIOCHACON_LOGIN_URL
+from .exceptions import DIOChaconAPIError
+from .exceptions import DIOChaconInvalidAuthError
+from .metrics import ClientMetrics
+from .retry import RetryPolicy
+from .utils import redact_payload
 from .utils import redact_url
-
-
-MAX_FAILED_ATTEMPTS = 5
+from .utils import WIRE_LOGGER
 
 STATE_CONNECTED = "connected"
 STATE_DISCONNECTED = "disconnected"
@@ -23,6 +32,44 @@ STATE_STOPPED = "stopped"
 _LOGGER = logging.getLogger(__name__)
 
 
+def _create_wire_trace_config() -> aiohttp.TraceConfig:
+    """Creates the aiohttp trace config logging the redacted HTTP exchanges with their timings."""
+
+    async def on_request_start(session, trace_config_ctx, params):
+        trace_config_ctx.start = asyncio.get_running_loop().time()
+        WIRE_LOGGER.debug("http request_start method=%s url=%s", params.method, redact_url(params.url))
+
+    async def on_request_chunk_sent(session, trace_config_ctx, params):
+        WIRE_LOGGER.debug(
+            "http request_chunk_sent method=%s url=%s size=%d", params.method, redact_url(params.url), len(params.chunk)
+        )
+
+    async def on_response_chunk_received(session, trace_config_ctx, params):
+        WIRE_LOGGER.debug(
+            "http response_chunk_received method=%s url=%s size=%d",
+            params.method,
+            redact_url(params.url),
+            len(params.chunk),
+        )
+
+    async def on_request_end(session, trace_config_ctx, params):
+        elapsed_ms = (asyncio.get_running_loop().time() - trace_config_ctx.start) * 1000
+        WIRE_LOGGER.debug(
+            "http request_end method=%s url=%s status=%s elapsed_ms=%.1f",
+            params.method,
+            redact_url(params.url),
+            params.response.status,
+            elapsed_ms,
+        )
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
+
+
 class DIOChaconClientSession:
     """HTTP session manager for DIO Chacon API.
 
@@ -32,6 +79,8 @@ class DIOChaconClientSession:
 
     _state: str = None
     _failed_attempts: int = 0
+    _connection_number: int = 0
+    _stopping: bool = False
     _aiohttp_session: aiohttp.ClientSession | None = None
     _websocket: aiohttp.ClientWebSocketResponse | None = None
     _listen_task: asyncio.Task | None = None
@@ -43,6 +92,13 @@ class DIOChaconClientSession:
         service_name: str,
         callback: callable,
         session_token: str = None,
+        codec: JSONCodec = None,
+        wire_tracing: bool = False,
+        retry_policy: RetryPolicy = None,
+        aiohttp_session: aiohttp.ClientSession = None,
+        connector: aiohttp.BaseConnector = None,
+        token_store: TokenStore = None,
+        metrics: ClientMetrics = None,
     ) -> None:
         """Initialize and authenticate.
 
@@ -55,35 +111,57 @@ class DIOChaconClientSession:
                    data (str): websocket payload contents deserialized from json
             session_token: token obtained from the HTTP login, used to authenticate
                 the websocket instead of the email and password
+            codec: the JSON codec used to decode and encode the websocket messages.
+                None means the fastest one installed (orjson, ujson or the stdlib json).
+            wire_tracing: True to log in the `dio_chacon_wifi_api.wire` logger the redacted frames
+                and HTTP exchanges with their timings. Off by default : nothing is formatted nor traced.
+            retry_policy: the delays between the reconnection attempts after a connection failure.
+                None means the default policy : fast first retry, jittered exponential backoff, unlimited attempts.
+            aiohttp_session: an HTTP session shared with other clients, used instead of creating one.
+                It is not closed at disconnection : its owner has to close it.
+            connector: a connection pool shared with other clients, used by the HTTP session created
+                when no aiohttp_session is given. It is not closed at disconnection either.
+            token_store: where the session tokens are kept. When given, the websocket is authenticated
+                with a session token : the stored one, else one obtained by the HTTP login. The login is
+                done again only when the server rejects the token.
+            metrics: where the received frames and the connection losses are counted.
+                None means a private instance.
         """
         self._login_email = login_email
         self._password = password
         self._service_name = service_name
         self._callback = callback
         self._session_token = session_token
-
-        async def on_request_start(session, trace_config_ctx, params):
-            _LOGGER.debug("aiohttp request start : %s %s", params.method, redact_url(params.url))
-
-        async def on_request_chunk_sent(session, trace_config_ctx, params):
-            _LOGGER.debug("aiohttp request chunk sent : %s %s", params.method, redact_url(params.url))
-
-        async def on_response_chunk_received(session, trace_config_ctx, params):
-            _LOGGER.debug("aiohttp response chunk received : %s %s", params.method, redact_url(params.url))
-
-        async def on_request_end(session, trace_config_ctx, params):
-            _LOGGER.debug("aiohttp request end : %s %s", params.method, redact_url(params.url))
-
-        trace_config = aiohttp.TraceConfig()
-        trace_config.on_request_start.append(on_request_start)
-        trace_config.on_request_end.append(on_request_end)
-        trace_config.on_request_chunk_sent.append(on_request_chunk_sent)
-        trace_config.on_response_chunk_received.append(on_response_chunk_received)
-        self._aiohttp_session = aiohttp.ClientSession(trace_configs=[trace_config])
+        self._codec: JSONCodec = codec or get_default_codec()
+        _LOGGER.debug("JSON codec used for websocket messages : %s", self._codec.name)
+        self._retry_policy: RetryPolicy = retry_policy or RetryPolicy()
+        self._token_store: TokenStore | None = token_store
+        self._metrics: ClientMetrics = metrics or ClientMetrics()
+        self._login_url: str = DIOCHACON_LOGIN_URL
+        # True once the stored token was rejected and replaced by a new login, to not log in again in loop.
+        self._token_renewed: bool = False
+
+        self._wire_tracing: bool = wire_tracing
+        # The aiohttp tracing is only installed in wire tracing mode to keep the hot path free of it.
+        trace_configs = [_create_wire_trace_config()] if wire_tracing else None
+        # True when the HTTP session is created, and so closed, by this object.
+        self._owns_aiohttp_session: bool = aiohttp_session is None
+        if aiohttp_session is not None:
+            if wire_tracing:
+                _LOGGER.warning("HTTP exchanges are not traced with a shared aiohttp session, only the frames are.")
+            self._aiohttp_session = aiohttp_session
+        else:
+            self._aiohttp_session = aiohttp.ClientSession(
+                connector=connector, connector_owner=connector is None, trace_configs=trace_configs
+            )
 
     def _set_server_urls(self, ws_url: str) -> None:
         # Simple method to easily mock the server url by overriding default values.
         self._ws_url = ws_url
+        url = URL(ws_url)
+        self._login_url = str(
+            url.with_scheme("https" if url.scheme == "wss" else "http").with_path("/api/session/login")
+        )
 
     async def ws_connect(self) -> None:
         """Make a connection to the server via websocket protocol."""
@@ -99,7 +177,57 @@ class DIOChaconClientSession:
         while self._state != STATE_STOPPED:
             await self._running()
 
+    async def _get_session_token(self) -> str | None:
+        """Returns the session token to use : the current one, the stored one or a new one from the HTTP login."""
+        if self._session_token is None:
+            self._session_token = await self._token_store.load(self._login_email)
+        if self._session_token is None:
+            _LOGGER.debug("No stored session token, logging in")
+            self._session_token = await fetch_session_token(
+                self._aiohttp_session, self._login_url, self._login_email, self._password
+            )
+            await self._token_store.save(self._login_email, self._session_token)
+        return self._session_token
+
+    async def _renew_session_token(self) -> bool:
+        """Forgets the session token rejected by the server so that the next connection logs in again.
+
+        Returns:
+            False when a new login is not possible or was already done for this rejection.
+        """
+        if self._token_store is None or self._token_renewed or not (self._login_email and self._password):
+            return False
+        _LOGGER.info("Session token rejected by the server, logging in again")
+        await self._token_store.delete(self._login_email)
+        self._session_token = None
+        self._token_renewed = True
+        return True
+
+    @staticmethod
+    def _is_connection_reply(msg: dict, action: str) -> bool:
+        return isinstance(msg, dict) and msg.get("name") == "connection" and msg.get("action") == action
+
     async def _running(self) -> None:
+        self._state = STATE_STARTING
+
+        if self._token_store is not None:
+            try:
+                await self._get_session_token()
+            except DIOChaconInvalidAuthError:
+                # Reported like a rejected websocket authentication, the message awaited at connection.
+                self._state = STATE_STOPPED
+                self._callback({"name": "connection", "action": "invalid", "data": ""})
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+                await self._wait_retry(error)
+                return
+            except (DIOChaconAPIError, OSError) as error:
+                # No token in the login response or a token store not writable : retrying cannot help.
+                _LOGGER.error("Session token unavailable : %s", error)
+                self._state = STATE_STOPPED
+                self._callback({"name": "connection", "action": "failed", "data": str(error)})
+                return
+
         if self._session_token:
             query_parameters = {'sessionToken': self._session_token}
         else:
@@ -110,13 +238,14 @@ class DIOChaconClientSession:
             }
         url = self._ws_url + "?" + urllib.parse.urlencode(query_parameters, safe=':')
 
-        self._state = STATE_STARTING
-
+        renewing_token = False
+        confirmed = False
         try:
             async with self._aiohttp_session.ws_connect(url, heartbeat=15, autoping=True) as ws_client:
                 self._state = STATE_CONNECTED
-                self._failed_attempts = 0
+                self._connection_number += 1
                 self._websocket = ws_client
+                self._metrics.on_connected()
                 async for message in ws_client:
                     if self._state == STATE_STOPPED:
                         break
@@ -130,37 +259,93 @@ class DIOChaconClientSession:
                         break
 
                     if message.type == aiohttp.WSMsgType.TEXT:
-                        _LOGGER.debug("Websocket received data %s", message)
-                        msg = message.json()
+                        # The text frames are decoded : their size in bytes is the one of their UTF-8 encoding.
+                        self._metrics.observe_frame(len(message.data.encode()))
+                        msg = self._codec.loads(message.data)
+                        if self._wire_tracing:
+                            WIRE_LOGGER.debug("ws recv size=%d data=%s", len(message.data), redact_payload(msg))
+                        if self._token_store is not None and self._is_connection_reply(msg, "invalid"):
+                            if await self._renew_session_token():
+                                # Reconnects at once with a new token, the callback never sees the rejection.
+                                renewing_token = True
+                                break
+                        elif self._is_connection_reply(msg, "success"):
+                            # Only a connection confirmed by the server ends the backoff of the retries.
+                            self._failed_attempts = 0
+                            self._token_renewed = False
+                            confirmed = True
                         self._callback(msg)
 
+            if self._stopping:
+                self._state = STATE_STOPPED
+            elif self._state != STATE_STOPPED:
+                _LOGGER.warning("Websocket connection lost, reconnecting...")
+                self._state = STATE_DISCONNECTED
+                self._metrics.on_connection_lost()
+                if not (renewing_token or confirmed):
+                    # Like a failed connection : a server closing each new connection is not retried in loop.
+                    # A confirmed connection which is lost is reconnected at once.
+                    await self._wait_retry("connection closed")
+
         except aiohttp.ClientResponseError as error:
             _LOGGER.error("Unexpected response received from server : %s %s", error.status, error.message)
             self._state = STATE_STOPPED
         except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as error:
-            if self._failed_attempts >= MAX_FAILED_ATTEMPTS:
-                _LOGGER.error("Too many retries to reconnect to server. Please restart globally.")
-                self._state = STATE_STOPPED
-            elif self._state != STATE_STOPPED:
-                retry_delay = min(2 ** (self._failed_attempts - 1) * 30, 300)
-                self._failed_attempts += 1
-                _LOGGER.error("Websocket connection failed, retrying in %ds: %s", retry_delay, error)
-                self._state = STATE_DISCONNECTED
-                await asyncio.sleep(retry_delay)
+            await self._wait_retry(error)
         except Exception as error:
             if self._state != STATE_STOPPED:
                 _LOGGER.exception("Unexpected exception occurred: %s", error)
                 self._state = STATE_STOPPED
 
-    async def disconnect(self) -> None:
+    async def _wait_retry(self, error: Exception | str) -> None:
+        """Waits before the next connection attempt, or stops the session when the retry policy gives up."""
+        if self._state == STATE_STOPPED:
+            return
+        self._failed_attempts += 1
+        retry_delay = self._retry_policy.get_delay(self._failed_attempts)
+        if retry_delay is None:
+            _LOGGER.error("Too many retries to reconnect to server. Please restart globally.")
+            self._state = STATE_STOPPED
+        else:
+            _LOGGER.error("Websocket connection failed, retrying in %.1fs: %s", retry_delay, error)
+            self._state = STATE_DISCONNECTED
+            await asyncio.sleep(retry_delay)
+
+    def prepare_disconnect(self) -> None:
+        """Disables the reconnection so that a websocket closed by the server from now on (at logout) is final."""
+        self._stopping = True
+
+    async def disconnect(self, timeout: float = DEFAULT_DISCONNECT_TIMEOUT) -> None:
+        """Closes the websocket, terminates the listening task and closes the HTTP session.
+
+        Parameters:
+            timeout: maximum delay in seconds to wait for the websocket closing handshake, then for the listening
+                task to terminate before cancelling it.
+        """
         _LOGGER.debug("Disconnection of the current session")
+        was_connected = self.is_connected()
         self._state = STATE_STOPPED
         if self._websocket:
-            await self._websocket.close()
-        if self._aiohttp_session:
+            try:
+                # aiohttp waits for the close frame of the server up to its own, longer, timeout.
+                await asyncio.wait_for(self._websocket.close(), timeout)
+            except asyncio.TimeoutError:
+                _LOGGER.warning("Websocket not closed by the server after %ss.", timeout)
+
+        listen_task = self._listen_task
+        if listen_task and not listen_task.done() and listen_task is not asyncio.current_task():
+            if not was_connected:
+                # The task may be connecting or waiting before a retry : nothing to wait for.
+                listen_task.cancel()
+            done, _ = await asyncio.wait([listen_task], timeout=timeout)
+            if not done:
+                _LOGGER.warning("Websocket listening not terminated after %ss, cancelling it.", timeout)
+                listen_task.cancel()
+                await asyncio.wait([listen_task])
+
+        if self._aiohttp_session and self._owns_aiohttp_session:
             await self._aiohttp_session.close()
-        # Let the _listen infinite loop terminate correctly with STATE_STOPPED signal.
-        await asyncio.sleep(0.5)
+        self._metrics.on_stopped()
         _LOGGER.debug("Disconnection done")
 
     async def ws_send_message(self, msg) -> None:
@@ -169,7 +354,20 @@ class DIOChaconClientSession:
         Parameters:
             msg: the message to be sent
         """
-        await self._websocket.send_str(json.dumps(msg))
+        data = self._codec.dumps(msg)
+        if self._wire_tracing:
+            WIRE_LOGGER.debug("ws send size=%d data=%s", len(data), redact_payload(msg))
+        await self._websocket.send_str(data)
 
     def is_disconnected(self) -> bool:
-        return self._state == STATE_STOPPED or self._websocket.closed
+        """True when the session is stopped for good : it will not reconnect anymore."""
+        return self._state == STATE_STOPPED
+
+    @property
+    def connection_number(self) -> int:
+        """Number of the current websocket connection, incremented at each (re)connection."""
+        return self._connection_number
+
+    def is_connected(self) -> bool:
+        """True when the websocket is open, False while connecting or reconnecting in background."""
+        return self._state == STATE_CONNECTED and self._websocket is not None and not self._websocket.closed
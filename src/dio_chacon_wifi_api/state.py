@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""In memory mirror of the devices states for the DIO Chacon wifi API."""
+import time
+
+from .records import DeviceState
+
+
+class DeviceStateCache:
+    """Last known state of each device, keyed by device id.
+
+    It is fed by the `/device/states` responses and by the `deviceState` events pushed by the server.
+    Each state is a `DeviceState` record like the ones returned by `get_status_details`, replaced by the next
+    state received for the device.
+    The time of reception of each state is also kept to know its freshness.
+    """
+
+    def __init__(self) -> None:
+        self._states: dict[str, DeviceState] = dict()
+        self._timestamps: dict[str, float] = dict()
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def __contains__(self, device_id: str) -> bool:
+        return device_id in self._states
+
+    def get(self, device_id: str) -> DeviceState | None:
+        """Returns the last known state of the device or None when unknown.
+
+        The record must not be modified : it is replaced at each new state of the device.
+        """
+        return self._states.get(device_id)
+
+    def get_fresh(self, device_id: str, max_age: float) -> DeviceState | None:
+        """Returns the last known state of the device when it was received less than `max_age` seconds ago."""
+        timestamp = self._timestamps.get(device_id)
+        if timestamp is None or time.monotonic() - timestamp > max_age:
+            return None
+        return self._states[device_id]
+
+    def get_all(self) -> dict[str, DeviceState]:
+        """Returns a new dict keyed by device id of all the last known states."""
+        return dict(self._states)
+
+    def update(self, device_id: str, state: dict) -> None:
+        """Stores the state received for the device."""
+        self._states[device_id] = DeviceState(state)
+        self._timestamps[device_id] = time.monotonic()
+
+    def clear(self) -> None:
+        self._states.clear()
+        self._timestamps.clear()
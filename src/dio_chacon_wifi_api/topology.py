@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""Index of the rooms and groups of the account, with the devices they contain."""
+from .exceptions import DIOChaconAPIError
+from .records import Device
+
+
+def _group_device_ids(raw_group: dict) -> list[str]:
+    # The group members are listed as device ids or as device descriptions.
+    return [member["id"] if isinstance(member, dict) else member for member in raw_group.get("devices") or []]
+
+
+class TopologyIndex:
+    """Rooms and groups keyed by id, each one as a dict with id, name and the ids of its devices.
+
+    The rooms are filled from the devices inventory (the room of a device is given by its description),
+    the groups from their own description. The room and group lists are loaded once from the server,
+    the room members are computed again only when the inventory changed.
+    """
+
+    def __init__(self) -> None:
+        self.rooms: dict[str, dict] | None = None
+        self.groups: dict[str, dict] | None = None
+        self._rooms_stale: bool = True
+
+    def load_rooms(self, raw_rooms: list[dict]) -> None:
+        self.rooms = {room["id"]: {"id": room["id"], "name": room.get("name"), "devices": []} for room in raw_rooms}
+        self._rooms_stale = True
+
+    def load_groups(self, raw_groups: list[dict]) -> None:
+        self.groups = {
+            group["id"]: {"id": group["id"], "name": group.get("name"), "devices": _group_device_ids(group)}
+            for group in raw_groups
+        }
+
+    def invalidate_rooms(self) -> None:
+        """Marks the room members to be computed again, after a change of the devices inventory."""
+        self._rooms_stale = True
+
+    def index_rooms(self, devices: dict[str, Device]) -> None:
+        """Computes the devices of each room from the devices inventory, when it changed since the last time."""
+        if not self._rooms_stale or self.rooms is None:
+            return
+        for room in self.rooms.values():
+            room["devices"] = []
+        for device in devices.values():
+            room = self.rooms.get(device.room_id)
+            if room is not None:
+                room["devices"].append(device.id)
+        self._rooms_stale = False
+
+    @staticmethod
+    def find(entries: dict[str, dict], id_or_name: str) -> dict:
+        """Returns the room or group with this id, else with this name.
+
+        Raises:
+            DIOChaconAPIError: when there is none.
+        """
+        entry = entries.get(id_or_name)
+        if entry is not None:
+            return entry
+        for entry in entries.values():
+            if entry["name"] == id_or_name:
+                return entry
+        raise DIOChaconAPIError(f"Unknown room or group : {id_or_name}")
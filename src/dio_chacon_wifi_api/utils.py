@@ -1,12 +1,33 @@
 # -*- coding: utf-8 -*-
 """Utility helpers shared across the DIO Chacon wifi API modules."""
+import logging
+from typing import Any
+
 from yarl import URL
 
 
 SENSITIVE_QUERY_KEYS = ("email", "password", "sessionToken")
 
+# Payload keys whose value is masked in wire traces : credentials, tokens and signed image URLs.
+SENSITIVE_PAYLOAD_KEYS = frozenset(SENSITIVE_QUERY_KEYS + ("bleKey", "image"))
+
+# Logger of the wire traces, only used when the wire tracing mode is enabled on the client or session.
+WIRE_LOGGER = logging.getLogger("dio_chacon_wifi_api.wire")
+
 
 def redact_url(url: URL) -> str:
     """Returns the URL as a string with sensitive query parameters masked."""
     redactions = {key: "***" for key in SENSITIVE_QUERY_KEYS if key in url.query}
     return str(url.update_query(redactions))
+
+
+def redact_payload(payload: Any) -> Any:
+    """Returns a copy of a websocket payload with the values of sensitive keys masked, at any depth."""
+    if isinstance(payload, dict):
+        return {
+            key: "***" if key in SENSITIVE_PAYLOAD_KEYS and value is not None else redact_payload(value)
+            for key, value in payload.items()
+        }
+    if isinstance(payload, list):
+        return [redact_payload(value) for value in payload]
+    return payload
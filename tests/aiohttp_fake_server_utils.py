@@ -5,6 +5,7 @@ Inspired from : https://gist.github.com/ex3cv/2bbbbaf748c604fd737e1bb8372336e7
 import asyncio
 import json
 import logging
+import random
 from asyncio import Queue
 from functools import partial
 
@@ -16,6 +17,65 @@ _LOGGER = logging.getLogger(__name__)
 MOCK_PORT = 38080
 
 INVALID_PASSWORD = "PASS_INVALID_AUTH"
+EXPIRED_SESSION_TOKEN = "r:myexpiredsessionToken"
+
+# Websockets currently opened by the clients on the fake server, to drop them from a test.
+OPEN_WEBSOCKETS = web.AppKey("open_websockets", set)
+
+
+def build_device_states_data(nb_devices: int) -> dict:
+    """Builds a realistic /device/states data for nb_devices shutters, with the links described in Protocol.md."""
+    data = {}
+    for index in range(nb_devices):
+        device_id = f"L4HActuator_idbench{index}"
+        data[device_id] = {
+            "rt": "oic.d.blind",
+            "href": f"/v1/devices/{device_id}",
+            "provider": "L4HActuator",
+            "rc": 1,
+            "t": 0,
+            "di": device_id,
+            "n": f"CERSwd-3B_{index}",
+            "links": [
+                {"rt": "oic.wk.p", "href": "platform", "mnmo": "CERSwd-3B", "mnfv": "1.0.6", "mnhw": "1.0"},
+                {
+                    "rt": "oic.r.movement.linear",
+                    "href": "mvtlinear",
+                    "movement": "stop",
+                    "movementSettings": ["stop", "up", "down"],
+                },
+                {"rt": "oic.r.openlevel", "href": "openlevel", "openLevel": index % 101},
+                {
+                    "rt": "gw.r.shutter.calibration",
+                    "href": "shuttercalibration",
+                    "up_ms": 10683,
+                    "down_ms": 10370,
+                    "direction": 0,
+                    "reset": False,
+                    "door": False,
+                },
+                {
+                    "rt": "gw.r.schedule",
+                    "href": "schedule",
+                    "maxSchedules": 8,
+                    "sun": 1,
+                    "schedules": [
+                        {
+                            "id": schedule,
+                            "enabled": True,
+                            "days": [1, 2, 3, 4, 5],
+                            "time": "07:30",
+                            "sunOffset": 0,
+                            "action": {"openLevel": 100},
+                        }
+                        for schedule in range(8)
+                    ],
+                },
+                {"rt": "gw.r.dio1.switch", "href": "dio1_switch", "value": 0},
+                {"rt": "gw.r.dio1.paired", "href": "dio1paired", "paired": [{"id": 1, "type": "remote"}]},
+            ],
+        }
+    return data
 
 
 async def endpoint(
@@ -44,7 +104,43 @@ async def endpoint(
     return None
 
 
-async def websocket_messages_handler(ws: aiohttp.web_ws.WebSocketResponse, recording_queue: Queue):
+class DelayedWebSocket:
+    """Server websocket sending each frame after the injected delay plus a random jitter, without blocking the
+    handling of the next requests : like a real server, several requests are processed concurrently and their
+    responses may be sent out of order."""
+
+    def __init__(self, ws: aiohttp.web_ws.WebSocketResponse, delay: float, jitter: float) -> None:
+        self._ws = ws
+        self._delay = delay
+        self._jitter = jitter
+        self._send_tasks: set[asyncio.Task] = set()
+
+    def __aiter__(self):
+        return self._ws.__aiter__()
+
+    @property
+    def closed(self) -> bool:
+        return self._ws.closed
+
+    async def send_str(self, data: str) -> None:
+        task = asyncio.create_task(self._delayed_send(data))
+        self._send_tasks.add(task)
+        task.add_done_callback(self._send_tasks.discard)
+
+    async def _delayed_send(self, data: str) -> None:
+        await asyncio.sleep(self._delay + random.uniform(0, self._jitter))
+        if not self._ws.closed:
+            await self._ws.send_str(data)
+
+    async def close(self) -> None:
+        if self._send_tasks:
+            await asyncio.wait(self._send_tasks)
+        await self._ws.close()
+
+
+async def websocket_messages_handler(
+    ws: aiohttp.web_ws.WebSocketResponse, recording_queue: Queue, device_states_data: dict | None = None
+):
     async for msg in ws:
         _LOGGER.debug("MOCK Server WS : received message : %s", msg)
         if msg.type == aiohttp.WSMsgType.TEXT:
@@ -84,6 +180,7 @@ async def websocket_messages_handler(ws: aiohttp.web_ws.WebSocketResponse, recor
                 response["data"][0]["type"] = ".dio1.wifi.shutter.mvt_linear."
                 response["data"][0]["modelName"] = "CERSwd-3B"
                 response["data"][0]["softwareVersion"] = "1.0.6"
+                response["data"][0]["roomId"] = "room_living"
                 # Add one switch
                 response["data"].append({})
                 response["data"][1]["id"] = "L4HActuator_idmock2"
@@ -91,6 +188,7 @@ async def websocket_messages_handler(ws: aiohttp.web_ws.WebSocketResponse, recor
                 response["data"][1]["type"] = ".dio1.wifi.genericSwitch.switch."
                 response["data"][1]["modelName"] = "CERNwd-3B"
                 response["data"][1]["softwareVersion"] = "1.0.4"
+                response["data"][1]["roomId"] = "room_living"
                 # Add one unknown device
                 response["data"].append({})
                 response["data"][2]["id"] = "L4HActuator_idmock3"
@@ -109,6 +207,23 @@ async def websocket_messages_handler(ws: aiohttp.web_ws.WebSocketResponse, recor
                 _LOGGER.debug("MOCK Server WS : response /device to send. %s", response)
                 await ws.send_str(json.dumps(response))
 
+            if path == "/room":
+                response = {"id": id, "status": 200}
+                response["data"] = [
+                    {"id": "room_living", "name": "Living room"},
+                    {"id": "room_kitchen", "name": "Kitchen"},
+                ]
+                _LOGGER.debug("MOCK Server WS : response /room to send. %s", response)
+                await ws.send_str(json.dumps(response))
+
+            if path == "/group":
+                response = {"id": id, "status": 200}
+                response["data"] = [
+                    {"id": "group_lights", "name": "All lights", "devices": ["L4HActuator_idmock2"]},
+                ]
+                _LOGGER.debug("MOCK Server WS : response /group to send. %s", response)
+                await ws.send_str(json.dumps(response))
+
             if path == "/device/states":
                 response = {}
                 response["id"] = id
@@ -140,6 +255,8 @@ async def websocket_messages_handler(ws: aiohttp.web_ws.WebSocketResponse, recor
                     "reason": None,
                     "image": "https://mock.example.com/ring.jpeg",
                 }
+                if device_states_data is not None:
+                    response["data"] = device_states_data
 
                 _LOGGER.debug("MOCK Server WS : response /device/states to send. %s", response)
                 await ws.send_str(json.dumps(response))
@@ -255,12 +372,20 @@ async def pump_push_queue(ws: aiohttp.web_ws.WebSocketResponse, push_queue: Queu
         push_queue.task_done()
 
 
-async def websocket_handler(request: web.Request, recording_queue: Queue, push_queue: Queue | None = None):
+async def websocket_handler(
+    request: web.Request,
+    recording_queue: Queue,
+    push_queue: Queue | None = None,
+    response_delay: float = 0.0,
+    response_jitter: float = 0.0,
+    device_states_data: dict | None = None,
+):
     _LOGGER.debug('MOCK Server WS : Websocket connection starting')
     ws = web.WebSocketResponse()
     await ws.prepare(request)
+    request.app[OPEN_WEBSOCKETS].add(ws)
     _LOGGER.debug('MOCK Server WS : Websocket connection ready')
-    if request.query.get("password") == INVALID_PASSWORD:
+    if request.query.get("password") == INVALID_PASSWORD or request.query.get("sessionToken") == EXPIRED_SESSION_TOKEN:
         _LOGGER.debug('MOCK Server WS : Sending invalid auth for connection failure')
         await ws.send_str('{"name":"connection","action":"invalid","data":""}')
     else:
@@ -269,7 +394,9 @@ async def websocket_handler(request: web.Request, recording_queue: Queue, push_q
 
     pump_task = asyncio.create_task(pump_push_queue(ws, push_queue)) if push_queue is not None else None
 
-    await asyncio.create_task(websocket_messages_handler(ws, recording_queue))
+    responding_ws = DelayedWebSocket(ws, response_delay, response_jitter) if response_delay or response_jitter else ws
+    await asyncio.create_task(websocket_messages_handler(responding_ws, recording_queue, device_states_data))
+    request.app[OPEN_WEBSOCKETS].discard(ws)
 
     if pump_task is not None:
         pump_task.cancel()
@@ -281,14 +408,40 @@ async def websocket_handler(request: web.Request, recording_queue: Queue, push_q
     return ws
 
 
-async def run_fake_http_server(aiohttp_server, recording_queue: Queue, push_queue: Queue | None = None) -> None:
+async def run_fake_http_server(
+    aiohttp_server,
+    recording_queue: Queue,
+    push_queue: Queue | None = None,
+    response_delay: float = 0.0,
+    response_jitter: float = 0.0,
+    device_states_data: dict | None = None,
+):
+    """Starts the fake server on MOCK_PORT.
+
+    Parameters:
+        response_delay: delay in seconds injected before each websocket response and server side event.
+        response_jitter: maximum random delay in seconds added to response_delay.
+        device_states_data: the data answered to /device/states instead of the one of the mocked devices,
+            for example from `build_device_states_data`.
+
+    Returns:
+        The test server : its websockets opened by the clients are in `server.app[OPEN_WEBSOCKETS]`.
+    """
 
     _LOGGER.debug("Starting Mock server...")
 
     app = web.Application()
+    app[OPEN_WEBSOCKETS] = set()
 
     call = partial(endpoint, recording_queue=recording_queue)
-    call_ws = partial(websocket_handler, recording_queue=recording_queue, push_queue=push_queue)
+    call_ws = partial(
+        websocket_handler,
+        recording_queue=recording_queue,
+        push_queue=push_queue,
+        response_delay=response_delay,
+        response_jitter=response_jitter,
+        device_states_data=device_states_data,
+    )
     app.add_routes([web.route("*", "/api/{tail:.*}", call), web.route("*", "/ws", call_ws)])
 
-    await aiohttp_server(app, port=MOCK_PORT)
+    return await aiohttp_server(app, port=MOCK_PORT)
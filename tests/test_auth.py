@@ -0,0 +1,136 @@
+# coding: utf-8
+"""Tests auth.py. HTTP login and session token stores."""
+import asyncio
+import os
+import stat
+
+import aiohttp
+import pytest
+from aiohttp_fake_server_utils import EXPIRED_SESSION_TOKEN
+from aiohttp_fake_server_utils import INVALID_PASSWORD
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.auth import fetch_session_token
+from dio_chacon_wifi_api.auth import FileTokenStore
+from dio_chacon_wifi_api.auth import MemoryTokenStore
+from dio_chacon_wifi_api import session as session_module
+from dio_chacon_wifi_api.auth import TokenStore
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.exceptions import DIOChaconAPIError
+from dio_chacon_wifi_api.exceptions import DIOChaconInvalidAuthError
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+LOGIN_URL = f"http://localhost:{MOCK_PORT}/api/session/login"
+
+
+@pytest.mark.asyncio
+async def test_fetch_session_token(aiohttp_server) -> None:
+    """The HTTP login returns the session token, or raises for bad credentials."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    async with aiohttp.ClientSession() as session:
+        assert await fetch_session_token(session, LOGIN_URL, USERNAME, PASSWORD) == "r:myfakesessionToken"
+        request = await recording_queue.get()
+        assert request["method"] == "POST"
+        assert '"installationId": "top"' in request["body"]
+
+        with pytest.raises(DIOChaconInvalidAuthError):
+            await fetch_session_token(session, LOGIN_URL, USERNAME, INVALID_PASSWORD)
+
+
+@pytest.mark.asyncio
+async def test_file_token_store(tmp_path) -> None:
+    """The tokens are kept by account in a file readable by its owner only."""
+
+    path = str(tmp_path / "tokens.json")
+    store = FileTokenStore(path)
+    assert await store.load(USERNAME) is None
+
+    await store.save(USERNAME, "r:token1")
+    await store.save("other@toto.com", "r:token2")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    # A new store, as after a restart, reads the same tokens.
+    assert await FileTokenStore(path).load(USERNAME) == "r:token1"
+
+    await store.delete(USERNAME)
+    assert await store.load(USERNAME) is None
+    assert await store.load("other@toto.com") == "r:token2"
+
+
+@pytest.mark.asyncio
+async def test_client_token_store_reuses_token(aiohttp_server) -> None:
+    """The HTTP login is done once, the next connections reuse the stored token."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    store = MemoryTokenStore()
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, token_store=store)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    assert await client.get_user_id() == "mocked-user-id"
+    assert (await recording_queue.get())["rel_url"] == "/api/session/login"
+    assert await store.load(USERNAME) == "r:myfakesessionToken"
+    await client.disconnect()
+    await recording_queue.get()
+
+    # The stored token is not logged out and a new client connects without login.
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, token_store=store)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    assert await client.get_user_id() == "mocked-user-id"
+    assert (await recording_queue.get())["path"] == "/user"
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_token_store_renews_rejected_token(aiohttp_server) -> None:
+    """A stored token rejected by the server is replaced by a new login, transparently."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    store = MemoryTokenStore()
+    await store.save(USERNAME, EXPIRED_SESSION_TOKEN)
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, token_store=store)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    assert await client.get_user_id() == "mocked-user-id"
+    assert (await recording_queue.get())["rel_url"] == "/api/session/login"
+    assert await store.load(USERNAME) == "r:myfakesessionToken"
+    await client.disconnect()
+
+    # Bad credentials are still reported as such.
+    client = DIOChaconAPIClient(USERNAME, INVALID_PASSWORD, token_store=MemoryTokenStore())
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    with pytest.raises(DIOChaconInvalidAuthError):
+        await client.connect()
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_token_store_failures(aiohttp_server, tmp_path, monkeypatch) -> None:
+    """A login without token or a token store not writable stops the session and fails the call at once."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    store: TokenStore = FileTokenStore(str(tmp_path / "missing_dir" / "tokens.json"))
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, token_store=store)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    with pytest.raises(DIOChaconAPIError, match="Connection failed"):
+        await asyncio.wait_for(client.get_user_id(), 2)
+    assert client._session is None
+    await client.disconnect()
+
+    async def fetch_without_token(*args) -> str:
+        raise DIOChaconAPIError("No session token in the login response !")
+
+    monkeypatch.setattr(session_module, "fetch_session_token", fetch_without_token)
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, token_store=MemoryTokenStore())
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    with pytest.raises(DIOChaconAPIError, match="No session token"):
+        await asyncio.wait_for(client.connect(), 2)
+    assert client._session is None
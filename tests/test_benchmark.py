@@ -0,0 +1,370 @@
+# coding: utf-8
+"""Benchmarks of the client hot paths against the fake server of aiohttp_fake_server_utils.py, and micro-benchmarks
+of the parsing and of the device records.
+
+They only assert correctness (and that pipelining overlaps the server delay, and the memory budget of an account) :
+the numbers are logged at INFO level.
+They are skipped unless the environment variable DIO_CHACON_BENCH is set. Run them on their own with :
+
+    DIO_CHACON_BENCH=1 pytest tests/test_benchmark.py -o log_cli_level=INFO
+
+The environment variables DIO_CHACON_BENCH_DELAY and DIO_CHACON_BENCH_JITTER inject a delay and a random jitter in
+seconds before each response of the fake server, to measure the client against a realistic network round trip.
+"""
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+import timeit
+import tracemalloc
+
+import pytest
+from aiohttp_fake_server_utils import build_device_states_data
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import OPEN_WEBSOCKETS
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.codec import get_default_codec
+from dio_chacon_wifi_api.codec import STDLIB_JSON_CODEC
+from dio_chacon_wifi_api.const import DeviceTypeEnum
+from dio_chacon_wifi_api.links import extract_links_state
+from dio_chacon_wifi_api.pool import DIOChaconAccountPool
+from dio_chacon_wifi_api.records import Device
+from dio_chacon_wifi_api.records import DeviceState
+
+_LOGGER = logging.getLogger(__name__)
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+
+pytestmark = pytest.mark.skipif(not os.environ.get("DIO_CHACON_BENCH"), reason="Set DIO_CHACON_BENCH=1 to run.")
+
+SERVER_DELAY = float(os.environ.get("DIO_CHACON_BENCH_DELAY", "0"))
+SERVER_JITTER = float(os.environ.get("DIO_CHACON_BENCH_JITTER", "0"))
+
+
+async def _start(aiohttp_server, push_queue: asyncio.Queue = None, **server_options):
+    server_options.setdefault("response_delay", SERVER_DELAY)
+    server_options.setdefault("response_jitter", SERVER_JITTER)
+    server = await run_fake_http_server(aiohttp_server, asyncio.Queue(), push_queue=push_queue, **server_options)
+    client = DIOChaconAPIClient(USERNAME, PASSWORD)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.connect()
+    return server, client
+
+
+def _log_latencies(name: str, durations: list[float]) -> None:
+    durations = sorted(durations)
+    _LOGGER.info(
+        "%s x %d (server delay %.1f ms, jitter %.1f ms) : p50 %.2f ms, p95 %.2f ms, max %.2f ms",
+        name,
+        len(durations),
+        SERVER_DELAY * 1000,
+        SERVER_JITTER * 1000,
+        statistics.median(durations) * 1000,
+        durations[int(len(durations) * 0.95) - 1] * 1000,
+        durations[-1] * 1000,
+    )
+
+
+@pytest.mark.asyncio
+async def test_sequential_command_latency_benchmark(aiohttp_server) -> None:
+    """Latency of switch commands sent one after the other."""
+
+    _, client = await _start(aiohttp_server)
+
+    durations = []
+    for index in range(50):
+        start = time.perf_counter()
+        await client.switch_switch("L4HActuator_idmock2", index % 2 == 0)
+        durations.append(time.perf_counter() - start)
+
+    _log_latencies("Sequential switch commands", durations)
+    assert client.metrics.as_dict()["requests"]["/device/{id}/action/switch"]["count"] == 50
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_pipelined_throughput_benchmark(aiohttp_server) -> None:
+    """Throughput of concurrent requests pipelined on the websocket."""
+
+    _, client = await _start(aiohttp_server)
+    nb_requests = 500
+
+    start = time.perf_counter()
+    user_ids = await asyncio.gather(*(client.get_user_id() for _ in range(nb_requests)))
+    duration = time.perf_counter() - start
+
+    _LOGGER.info(
+        "Pipelined requests x %d (server delay %.1f ms, jitter %.1f ms) : %.0f requests/s",
+        nb_requests,
+        SERVER_DELAY * 1000,
+        SERVER_JITTER * 1000,
+        nb_requests / duration,
+    )
+    assert user_ids == ["mocked-user-id"] * nb_requests
+    assert client.in_flight_requests == 0
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_pipelining_overlaps_server_delay(aiohttp_server) -> None:
+    """Concurrent requests wait for the server delay together, not one after the other."""
+
+    _, client = await _start(aiohttp_server, response_delay=0.05, response_jitter=0.01)
+
+    start = time.perf_counter()
+    requests = asyncio.gather(*(client.get_user_id() for _ in range(20)))
+    max_in_flight = 0
+    while not requests.done():
+        max_in_flight = max(max_in_flight, client.in_flight_requests)
+        await asyncio.sleep(0.001)
+    duration = time.perf_counter() - start
+
+    _LOGGER.info("20 pipelined requests with a 50 ms server delay : %.0f ms", duration * 1000)
+    # Sent one after the other, a single request would await its response at a time.
+    assert max_in_flight == 20
+    assert requests.result() == ["mocked-user-id"] * 20
+    await client.disconnect()
+
+
+def test_extract_links_state_benchmark() -> None:
+    """Duration of the extraction of the states of 100 shutters with schedules, without the network."""
+
+    devices = list(build_device_states_data(100).values())
+
+    duration = min(timeit.repeat(lambda: [extract_links_state(d["links"]) for d in devices], number=20, repeat=5))
+
+    _LOGGER.info("Extracting %d device states x 20 : %.2f ms", len(devices), duration * 1000)
+    assert extract_links_state(devices[7]["links"])["openlevel"] == 7
+
+
+def test_codec_parsing_benchmark() -> None:
+    """Micro-benchmark of the decoding of a /device/states response for 50 shutters."""
+
+    payload = json.dumps({"id": 1, "status": 200, "data": build_device_states_data(50)})
+    codec = get_default_codec()
+
+    stdlib_duration = min(timeit.repeat(lambda: STDLIB_JSON_CODEC.loads(payload), number=20, repeat=5))
+    codec_duration = min(timeit.repeat(lambda: codec.loads(payload), number=20, repeat=5))
+
+    _LOGGER.info(
+        "Decoding %d bytes x 20 : json %.2f ms, %s %.2f ms",
+        len(payload),
+        stdlib_duration * 1000,
+        codec.name,
+        codec_duration * 1000,
+    )
+    assert codec.loads(payload) == STDLIB_JSON_CODEC.loads(payload)
+
+
+def test_enum_classification_benchmark() -> None:
+    """Duration of the classification of the device types of 1000 devices."""
+    labels = [".dio1.wifi.shutter.mvt_linear.", ".dio1.wifi.genericSwitch.switch.", ".dio1.wifi.unknown."] * 333
+
+    duration = min(timeit.repeat(lambda: [DeviceTypeEnum.from_dio_api(label) for label in labels], number=5, repeat=5))
+
+    _LOGGER.info("Classifying %d types x 5 : %.2f ms", len(labels), duration * 1000)
+    assert DeviceTypeEnum.from_dio_api(labels[0]) is DeviceTypeEnum.SHUTTER
+
+
+def test_records_memory_benchmark() -> None:
+    """Memory used by the states and devices of 10k shutters, as dicts and as records."""
+
+    nb_devices = 10000
+
+    def build_dicts() -> list:
+        return [
+            {
+                "id": f"L4HActuator_id{index}",
+                "name": f"Shutter {index}",
+                "type": "SHUTTER",
+                "model": "CERSwd-3B_1.0.6",
+                "connected": True,
+                "openlevel": index % 101,
+                "movement": "stop",
+            }
+            for index in range(nb_devices)
+        ]
+
+    def build_records() -> list:
+        return [Device(values) for values in build_dicts()]
+
+    def measure(build) -> int:
+        tracemalloc.start()
+        objects = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert len(objects) == nb_devices
+        return size
+
+    dicts_size = measure(build_dicts)
+    records_size = measure(build_records)
+
+    _LOGGER.info("%d devices : dicts %.0f KiB, records %.0f KiB", nb_devices, dicts_size / 1024, records_size / 1024)
+    assert records_size < dicts_size
+
+
+def test_records_timing_benchmark() -> None:
+    """Duration of the building, the update in place and the conversion of the states of 10k shutters, against the
+    copy of the same states as dicts."""
+
+    states = [
+        {"id": f"L4HActuator_id{index}", "connected": True, "openlevel": index % 101, "movement": "stop"}
+        for index in range(10000)
+    ]
+    records = [DeviceState(state) for state in states]
+
+    def measure(operation) -> float:
+        return min(timeit.repeat(operation, number=1, repeat=5))
+
+    dicts_duration = measure(lambda: [dict(state) for state in states])
+    build_duration = measure(lambda: [DeviceState(state) for state in states])
+    replace_duration = measure(lambda: [record.replace(state) for record, state in zip(records, states)])
+    to_dict_duration = measure(lambda: [record.to_dict() for record in records])
+
+    _LOGGER.info(
+        "%d states : dicts copy %.2f ms, records build %.2f ms, replace %.2f ms, to_dict %.2f ms",
+        len(states),
+        dicts_duration * 1000,
+        build_duration * 1000,
+        replace_duration * 1000,
+        to_dict_duration * 1000,
+    )
+    assert [record.to_dict() for record in records] == states
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("nb_devices", [10, 100, 1000])
+async def test_device_states_parsing_benchmark(aiohttp_server, nb_devices: int) -> None:
+    """Duration of `get_status_details` for a /device/states response of 10, 100 and 1000 shutters."""
+
+    device_states_data = build_device_states_data(nb_devices)
+    _, client = await _start(aiohttp_server, device_states_data=device_states_data)
+    ids = list(device_states_data)
+
+    durations = []
+    for _ in range(5):
+        start = time.perf_counter()
+        states = await client.get_status_details(ids)
+        durations.append(time.perf_counter() - start)
+
+    exported = client.metrics.as_dict()
+    _LOGGER.info(
+        "/device/states of %d shutters (%d bytes) : best %.2f ms, mean %.2f ms",
+        nb_devices,
+        exported["bytes_received"] // 5,
+        min(durations) * 1000,
+        statistics.mean(durations) * 1000,
+    )
+    assert len(states) == nb_devices
+    assert states["L4HActuator_idbench7"]["openlevel"] == 7
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_push_fan_out_benchmark(aiohttp_server) -> None:
+    """Rate of the server side events delivered to the global and the per device callbacks."""
+
+    push_queue: asyncio.Queue = asyncio.Queue()
+    _, client = await _start(aiohttp_server, push_queue=push_queue)
+    nb_events = 2000
+    nb_devices = 100
+    deliveries = 0
+    all_delivered = asyncio.Event()
+
+    def callback(data: dict) -> None:
+        nonlocal deliveries
+        deliveries += 1
+        if deliveries == nb_events * 2:
+            all_delivered.set()
+
+    client.set_callback_device_state(callback)
+    for index in range(nb_devices):
+        client.set_callback_device_state_by_device(f"L4HActuator_idbench{index}", callback)
+
+    start = time.perf_counter()
+    for index in range(nb_events):
+        push_queue.put_nowait(
+            {
+                "name": "deviceState",
+                "action": "update",
+                "data": {
+                    "di": f"L4HActuator_idbench{index % nb_devices}",
+                    "rc": 1,
+                    "links": [
+                        {"rt": "oic.r.openlevel", "openLevel": index % 101},
+                        {"rt": "oic.r.movement.linear", "movement": "down"},
+                    ],
+                },
+            }
+        )
+    await asyncio.wait_for(all_delivered.wait(), 30)
+    duration = time.perf_counter() - start
+
+    _LOGGER.info(
+        "Pushed events x %d to %d devices : %.0f events/s, callbacks mean %.1f us",
+        nb_events,
+        nb_devices,
+        nb_events / duration,
+        client.metrics.callback_latency.sum / client.metrics.callback_latency.count * 1e6,
+    )
+    assert client.metrics.callback_latency.count == nb_events * 2
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_recovery_benchmark(aiohttp_server) -> None:
+    """Delay between the loss of the connection by the server and the next successful request."""
+
+    server, client = await _start(aiohttp_server)
+
+    durations = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for ws in list(server.app[OPEN_WEBSOCKETS]):
+            await ws.close()
+        assert await client.get_user_id() == "mocked-user-id"
+        durations.append(time.perf_counter() - start)
+
+    _log_latencies("Reconnection recovery", durations)
+    exported = client.metrics.as_dict()
+    _LOGGER.info("Disconnected %.2f ms in total", exported["disconnected_seconds"] * 1000)
+    assert exported["reconnections"] == 5
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_pool_account_memory_benchmark(aiohttp_server) -> None:
+    """A connected account costs some tens of kilobytes of memory.
+
+    The measure includes the server side of the connections, served by the fake server in the same process :
+    it is an upper bound of the client side.
+    """
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    nb_accounts = 200
+    pool = DIOChaconAccountPool(max_concurrent_connections=50, connect_interval=0)
+    pool._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    # Warms up the shared HTTP session and the server.
+    pool.add_account("warm_up", USERNAME, PASSWORD)
+    await pool.connect_all()
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    for index in range(nb_accounts):
+        pool.add_account(f"account{index}", USERNAME, PASSWORD)
+    results = await pool.connect_all()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert all(error is None for error in results.values())
+    per_account = (after - before) / nb_accounts
+    _LOGGER.info("Memory per connected account : %d bytes", per_account)
+    assert per_account < 64 * 1024
+
+    await pool.disconnect_all()
@@ -1,15 +1,21 @@
 # coding: utf-8
 """Tests client.py. DIOChaconAPIClient class."""
 import asyncio
+import json
 import logging
 from typing import Any
 
+import aiohttp
 import pytest
 from aiohttp_fake_server_utils import MOCK_PORT
 from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api import client as client_module
 from dio_chacon_wifi_api.client import DIOChaconAPIClient
 from dio_chacon_wifi_api.const import ShutterMoveEnum
+from dio_chacon_wifi_api.exceptions import DIOChaconAPIError
 from dio_chacon_wifi_api.exceptions import DIOChaconInvalidAuthError
+from dio_chacon_wifi_api.retry import RetryPolicy
+from dio_chacon_wifi_api.session import DIOChaconClientSession
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -43,6 +49,11 @@ async def test_client_invalid_auth(aiohttp_server) -> None:
         await client.get_user_id()
 
     assert str(excinfo.value) == "Invalid username/password."
+    assert client._session is None
+
+    # The next call connects again and is rejected again, instead of waiting for a response.
+    with pytest.raises(DIOChaconInvalidAuthError):
+        await asyncio.wait_for(client.get_user_id(), 2)
 
     _LOGGER.debug("Invalid auth test OK. Disconnecting...")
 
@@ -119,6 +130,9 @@ async def test_client(aiohttp_server) -> None:
     assert effective_response["Tuya_idmock4"]["last_event_type"] == "ring"
     assert effective_response["Tuya_idmock4"]["last_event_timestamp"] == "2026-05-22T08:20:08.667Z"
     assert effective_response["Tuya_idmock4"]["last_event_image"] == "https://mock.example.com/ring.jpeg"
+    # The devices are plain dicts by default, serializable as is.
+    assert type(effective_response["Tuya_idmock4"]) is dict
+    json.dumps(effective_response)
 
     # Test move_shutter_direction
     await client.move_shutter_direction(shutter_id="L4HActuator_idmock1", direction=ShutterMoveEnum.DOWN)
@@ -317,3 +331,661 @@ async def test_doorbell_ring_push_received_via_websocket(aiohttp_server) -> None
     assert event["last_event_image"] == "https://mock.example.com/ring.jpeg"
 
     await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_response_timeout(aiohttp_server) -> None:
+    """A request without any server response fails after the per call deadline."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    # The fake server never answers to /static/all.
+    with pytest.raises(DIOChaconAPIError):
+        await client._send_ws_message("GET", "/static/all", {}, timeout=0.2)
+    assert len(client._pending_responses) == 0
+
+    # The next request is still correctly correlated.
+    assert await client.get_user_id(timeout=2) == "mocked-user-id"
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_responses_out_of_order() -> None:
+    """Responses are delivered to the request having the same id whatever their reception order."""
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    loop = asyncio.get_running_loop()
+    first = loop.create_future()
+    second = loop.create_future()
+    client._pending_responses.add(1, first)
+    client._pending_responses.add(2, second)
+
+    client._message_received_callback({"id": 2, "status": 200, "data": "second"})
+    client._message_received_callback({"id": 1, "status": 200, "data": "first"})
+    # A response for an unknown id is dropped.
+    client._message_received_callback({"id": 3, "status": 200, "data": "late"})
+
+    assert (await first)["data"] == "first"
+    assert (await second)["data"] == "second"
+    assert len(client._pending_responses) == 0
+    assert client.orphaned_responses_count == 1
+    assert client.evicted_requests_count == 0
+
+
+@pytest.mark.asyncio
+async def test_client_pipelined_commands(aiohttp_server) -> None:
+    """Concurrent commands are pipelined over the websocket within the in flight limit."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, max_in_flight_requests=8)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.get_user_id()
+    await recording_queue.get()
+
+    max_in_flight = 0
+    ws_send_message = client._session.ws_send_message
+
+    async def recording_ws_send_message(msg) -> None:
+        nonlocal max_in_flight
+        max_in_flight = max(max_in_flight, client.in_flight_requests)
+        await ws_send_message(msg)
+
+    client._session.ws_send_message = recording_ws_send_message
+
+    await asyncio.gather(
+        *[client.move_shutter_percentage(shutter_id="L4HActuator_idmock1", openlevel=level) for level in range(40)]
+    )
+
+    assert recording_queue.qsize() == 40
+    assert 1 < max_in_flight <= 8
+    assert client.in_flight_requests == 0
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_batch_actions(aiohttp_server) -> None:
+    """Batched actions return a result per device and a failing device does not stall the others."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    results = await client.move_shutters({"L4HActuator_idmock1": 0})
+    assert results == {"L4HActuator_idmock1": None}
+
+    results = await client.switch_switches({"L4HActuator_idmock2": True})
+    assert results == {"L4HActuator_idmock2": None}
+
+    # The fake server never answers for the unknown device.
+    results = await client.execute_batch(
+        {
+            "L4HActuator_unknown": ("openlevel", {"openLevel": 10}),
+            "L4HActuator_idmock1": ("mvtlinear", {"movement": "up"}),
+            "L4HActuator_idmock2": ("switch", {"value": 0}),
+        },
+        timeout=0.3,
+    )
+    assert isinstance(results["L4HActuator_unknown"], DIOChaconAPIError)
+    assert results["L4HActuator_idmock1"] is None
+    assert results["L4HActuator_idmock2"] is None
+
+    paths = []
+    while not recording_queue.empty():
+        paths.append((await recording_queue.get())["path"])
+    assert paths[-3:] == [
+        "/device/L4HActuator_unknown/action/openlevel",
+        "/device/L4HActuator_idmock1/action/mvtlinear",
+        "/device/L4HActuator_idmock2/action/switch",
+    ]
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_cached_device_states(aiohttp_server) -> None:
+    """The states cache is seeded by search_all_devices and kept current by the server side events."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    push_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue, push_queue=push_queue)
+
+    received_events: asyncio.Queue = asyncio.Queue()
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, cache_device_states=True)
+    client.set_callback_device_state(received_events.put_nowait)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    assert client.get_cached_state("L4HActuator_idmock1") is None
+
+    await client.search_all_devices(with_state=True)
+    assert client.get_cached_state("L4HActuator_idmock1")["openlevel"] == 75
+    assert not client.get_cached_state("L4HActuator_idmock2")["is_on"]
+    assert client.get_cached_state("L4HActuator_idmock3") is None
+    assert len(client.get_cached_states()) == 3
+
+    await push_queue.put(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {"di": "L4HActuator_idmock2", "rc": 1, "links": [{"rt": "oic.r.switch.binary", "value": 1}]},
+        }
+    )
+    await asyncio.wait_for(received_events.get(), 5)
+    assert client.get_cached_state("L4HActuator_idmock2")["is_on"]
+    assert client.get_cached_state("L4HActuator_idmock2")["type"] == "SWITCH_LIGHT"
+
+    await client.disconnect()
+
+
+def test_client_cache_disabled_by_default() -> None:
+    """Without the opt-in, no state is kept in memory."""
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._message_received_callback(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {"di": "L4HActuator_idmock2", "rc": 1, "links": [{"rt": "oic.r.switch.binary", "value": 1}]},
+        }
+    )
+    assert client.get_cached_state("L4HActuator_idmock2") is None
+    assert client.get_cached_states() == {}
+
+
+@pytest.mark.asyncio
+async def test_client_status_details_max_age(aiohttp_server) -> None:
+    """Only the stale or unknown devices are requested to the server when a max age is given."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, cache_device_states=True)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    await client.get_status_details(["L4HActuator_idmock1"])
+    await recording_queue.get()
+
+    # Fresh device answered from the cache, unknown one requested.
+    results = await client.get_status_details(["L4HActuator_idmock1", "L4HActuator_idmock5"], max_age=60)
+    effective_request = await asyncio.wait_for(recording_queue.get(), 2)
+    assert effective_request["parameters"] == {"devices": ["L4HActuator_idmock5"]}
+    assert results["L4HActuator_idmock1"]["openlevel"] == 75
+
+    # All devices fresh : no server call at all, the device callbacks are notified all the same.
+    notified = []
+    client.set_callback_device_state_by_device("L4HActuator_idmock1", notified.append)
+    client.set_callback_device_state_by_device("L4HActuator_idmock2", notified.append)
+    # Like after a pushed state, which carries the device type.
+    client._state_cache.update(
+        "L4HActuator_idmock2", {**results["L4HActuator_idmock1"], "id": "L4HActuator_idmock2", "type": "SHUTTER"}
+    )
+    results = await client.get_status_details(
+        ["L4HActuator_idmock1", "L4HActuator_idmock2"], notifyCallback=True, max_age=60
+    )
+    assert len(results) == 2
+    assert "type" not in results["L4HActuator_idmock2"]
+    assert [state["id"] for state in notified] == ["L4HActuator_idmock1", "L4HActuator_idmock2"]
+    assert recording_queue.empty()
+
+    # Stale devices are requested again.
+    await client.get_status_details(["L4HActuator_idmock1", "L4HActuator_idmock2"], max_age=0)
+    effective_request = await asyncio.wait_for(recording_queue.get(), 2)
+    assert effective_request["parameters"] == {"devices": ["L4HActuator_idmock1", "L4HActuator_idmock2"]}
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_async_dispatch(aiohttp_server) -> None:
+    """A slow coroutine callback does not delay the command acknowledges with async dispatch."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    push_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue, push_queue=push_queue)
+
+    received_events: asyncio.Queue = asyncio.Queue()
+    release_callback = asyncio.Event()
+
+    async def slow_callback(data: Any) -> None:
+        await release_callback.wait()
+        received_events.put_nowait(data)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, async_dispatch=True)
+    client.set_callback_device_state(slow_callback)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.get_user_id()
+
+    for value in (1, 0):
+        await push_queue.put(
+            {
+                "name": "deviceState",
+                "action": "update",
+                "data": {
+                    "di": "L4HActuator_idmock2",
+                    "rc": 1,
+                    "links": [{"rt": "oic.r.switch.binary", "value": value}],
+                },
+            }
+        )
+    await push_queue.join()
+
+    # The callback is blocked but the responses are still received.
+    assert await client.get_user_id(timeout=1) == "mocked-user-id"
+
+    release_callback.set()
+    first = await asyncio.wait_for(received_events.get(), 2)
+    second = await asyncio.wait_for(received_events.get(), 2)
+    assert first["is_on"]
+    assert not second["is_on"]
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_async_dispatch_status_details(aiohttp_server) -> None:
+    """The states notified by get_status_details are dispatched to the device callback after the pending events."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    global_events: list = []
+    device_events: list = []
+    release_callback = asyncio.Event()
+
+    async def slow_device_callback(data: Any) -> None:
+        await release_callback.wait()
+        device_events.append(data)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, async_dispatch=True)
+    client.set_callback_device_state(global_events.append)
+    client.set_callback_device_state_by_device("L4HActuator_idmock1", slow_device_callback)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    client._message_received_callback(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {"di": "L4HActuator_idmock1", "rc": 1, "links": [{"rt": "oic.r.openlevel", "openLevel": 10}]},
+        }
+    )
+    # The slow callback does not block the caller.
+    states = await asyncio.wait_for(client.get_status_details(["L4HActuator_idmock1"], notifyCallback=True), 1)
+    assert states["L4HActuator_idmock1"]["openlevel"] == 75
+
+    release_callback.set()
+    await client._dispatcher.join()
+    assert [event["openlevel"] for event in device_events] == [10, 75]
+    # Only the pushed event is sent to the global callback.
+    assert [event["openlevel"] for event in global_events] == [10]
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_coroutine_callback_inline() -> None:
+    """A coroutine callback is scheduled without async dispatch."""
+
+    received_events: list = []
+
+    async def coroutine_callback(data: Any) -> None:
+        received_events.append(data)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, callback_device_state=coroutine_callback)
+    client._message_received_callback(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {"di": "L4HActuator_idmock2", "rc": 1, "links": [{"rt": "oic.r.switch.binary", "value": 1}]},
+        }
+    )
+    await asyncio.sleep(0.01)
+    assert received_events[0]["is_on"]
+    assert not client._callback_tasks
+
+
+@pytest.mark.asyncio
+async def test_client_coalesced_shutter_events() -> None:
+    """Bursts of shutter events are coalesced by the client while other devices events are not."""
+
+    received_events: list = []
+    client = DIOChaconAPIClient(
+        USERNAME, PASSWORD, SERVICE_NAME, callback_device_state=received_events.append, coalesce_window=0.05
+    )
+
+    def shutter_push(level: int, movement: str) -> dict:
+        return {
+            "name": "deviceState",
+            "action": "update",
+            "data": {
+                "di": "L4HActuator_idmock1",
+                "rc": 1,
+                "links": [
+                    {"rt": "oic.r.openlevel", "openLevel": level},
+                    {"rt": "oic.r.movement.linear", "movement": movement},
+                ],
+            },
+        }
+
+    for level in (90, 80, 70):
+        client._message_received_callback(shutter_push(level, "down"))
+    client._message_received_callback(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {"di": "L4HActuator_idmock2", "rc": 1, "links": [{"rt": "oic.r.switch.binary", "value": 1}]},
+        }
+    )
+    client._message_received_callback(shutter_push(65, "stop"))
+
+    assert [(event["id"], event.get("openlevel")) for event in received_events] == [
+        ("L4HActuator_idmock1", 90),
+        ("L4HActuator_idmock2", None),
+        ("L4HActuator_idmock1", 65),
+    ]
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_command_after_reconnection(aiohttp_server) -> None:
+    """A command after a connection loss uses the session reconnected in background."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.get_user_id()
+    session = client._session
+
+    await session._websocket.close()
+
+    assert await client.get_user_id(timeout=2) == "mocked-user-id"
+    assert client._session is session
+    assert client._messages_connection_queue.empty()
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_resync_after_reconnection(aiohttp_server) -> None:
+    """After a reconnection, the states that changed while disconnected are notified."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    received_events: asyncio.Queue = asyncio.Queue()
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, cache_device_states=True)
+    client.set_callback_device_state(received_events.put_nowait)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.search_all_devices(with_state=True)
+
+    # Simulates a state of the shutter missed while disconnected.
+    client._state_cache.update("L4HActuator_idmock1", {"id": "L4HActuator_idmock1", "connected": True, "openlevel": 10})
+
+    await client._session._websocket.close()
+
+    event = await asyncio.wait_for(received_events.get(), 2)
+    assert event["id"] == "L4HActuator_idmock1"
+    assert event["type"] == "SHUTTER"
+    assert event["openlevel"] == 75
+    await asyncio.wait_for(client._resync_task, 2)
+    assert received_events.empty()
+    assert client.get_cached_state("L4HActuator_idmock1")["openlevel"] == 75
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_no_resync_without_cache(aiohttp_server) -> None:
+    """Without the states cache, there is no resynchronisation after a reconnection by default."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    received_events: list = []
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, retry_policy=RetryPolicy(first_delay=0.01))
+    client.set_callback_device_state(received_events.append)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.search_all_devices(with_state=True)
+
+    await client._session._websocket.close()
+    assert await client.get_user_id(timeout=2) == "mocked-user-id"
+
+    assert client._resync_task is None
+    assert received_events == []
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_requests_replayed_after_reconnection(aiohttp_server) -> None:
+    """Requests left unanswered by a lost connection or issued while reconnecting are sent once reconnected."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(
+        USERNAME, PASSWORD, SERVICE_NAME, max_outbox_size=1, retry_policy=RetryPolicy(first_delay=0.05, jitter=0)
+    )
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.get_user_id()
+    await recording_queue.get()
+    session = client._session
+    ws_send_message = session.ws_send_message
+
+    async def losing_ws_send_message(msg) -> None:
+        # The connection is lost right when the request is sent : it never reaches the server.
+        # The server stays unreachable until the url is restored.
+        session.ws_send_message = ws_send_message
+        session._set_server_urls(f"ws://localhost:{MOCK_PORT + 1}/ws")
+        await session._websocket.close()
+
+    session.ws_send_message = losing_ws_send_message
+
+    lost_request = asyncio.create_task(client.move_shutter_percentage("L4HActuator_idmock1", 20, timeout=3))
+    while session.is_connected() or not client._sent_messages:
+        await asyncio.sleep(0.01)
+    # Issued while reconnecting : held in the outbox.
+    held_request = asyncio.create_task(client.switch_switch("L4HActuator_idmock2", True, timeout=3))
+    await asyncio.sleep(0)
+    assert len(client._outbox) == 1
+    # The outbox is full.
+    with pytest.raises(DIOChaconAPIError):
+        await client.get_user_id()
+
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await asyncio.wait_for(asyncio.gather(lost_request, held_request), 3)
+
+    effective_request = await asyncio.wait_for(recording_queue.get(), 2)
+    assert effective_request["path"] == "/device/L4HActuator_idmock1/action/openlevel"
+    effective_request = await asyncio.wait_for(recording_queue.get(), 2)
+    assert effective_request["path"] == "/device/L4HActuator_idmock2/action/switch"
+    assert not client._outbox
+    assert not client._sent_messages
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_concurrent_first_calls(aiohttp_server) -> None:
+    """Calls made while the first connection is being confirmed are held then sent once it is."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    user_ids = await asyncio.wait_for(asyncio.gather(*(client.get_user_id(timeout=3) for _ in range(5))), 2)
+    assert user_ids == ["mocked-user-id"] * 5
+    assert not client._outbox
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_client_connect_and_context_manager(aiohttp_server, monkeypatch) -> None:
+    """The connection is opened beforehand by connect or the async context manager."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    async with client:
+        assert client._session.is_connected()
+        assert recording_queue.empty()
+        assert await client.get_user_id() == "mocked-user-id"
+    assert client._session.is_disconnected()
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, cache_device_states=True)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.connect(prefetch_devices=True)
+    assert client._device_types["L4HActuator_idmock1"] == "SHUTTER"
+    assert client.get_cached_state("L4HActuator_idmock1")["openlevel"] == 75
+
+    await client.disconnect()
+
+    # A failed connection closes everything it opened, __aexit__ not being called.
+    client = DIOChaconAPIClient(USERNAME, INVALID_PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    opened_sessions = []
+
+    class RecordingSession(DIOChaconClientSession):
+        async def ws_connect(self) -> None:
+            opened_sessions.append(self)
+            await super().ws_connect()
+
+    monkeypatch.setattr(client_module, "DIOChaconClientSession", RecordingSession)
+    with pytest.raises(DIOChaconInvalidAuthError):
+        async with client:
+            pass
+    session = opened_sessions[0]
+    assert client._session is None
+    assert session.is_disconnected()
+    assert session._listen_task.done()
+    assert session._aiohttp_session.closed
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_logout(aiohttp_server) -> None:
+    """With a session token, disconnect logs out then terminates the session without any fixed delay."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(session_token="r:myfakesessionToken")
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.connect()
+    session = client._session
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await client.disconnect()
+    assert loop.time() - start < 0.5
+
+    effective_request = await asyncio.wait_for(recording_queue.get(), 2)
+    assert effective_request["method"] == "POST"
+    assert effective_request["path"] == "/session/logout"
+    assert session.is_disconnected()
+    assert session._listen_task.done()
+    assert session._aiohttp_session.closed
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_fails_awaiting_requests(aiohttp_server) -> None:
+    """The requests still awaiting their response fail at disconnection, not at the end of their timeout."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await client.connect()
+
+    # The fake server never answers this request.
+    request = asyncio.create_task(client._send_ws_message("GET", "/static/all", {}, timeout=5))
+    await asyncio.wait_for(recording_queue.get(), 2)
+
+    await client.disconnect()
+    with pytest.raises(DIOChaconAPIError, match="client disconnected"):
+        await asyncio.wait_for(request, 0.5)
+    assert client.in_flight_requests == 0
+    assert not client._outbox and not client._sent_messages
+
+
+@pytest.mark.asyncio
+async def test_client_shared_aiohttp_session(aiohttp_server) -> None:
+    """Clients share an injected aiohttp session or connector and do not close it."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    async with aiohttp.ClientSession() as shared_session:
+        clients = [
+            DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, aiohttp_session=shared_session) for _ in range(2)
+        ]
+        for client in clients:
+            client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+            assert await client.get_user_id() == "mocked-user-id"
+            assert client._session._aiohttp_session is shared_session
+        for client in clients:
+            await client.disconnect()
+        assert not shared_session.closed
+
+    connector = aiohttp.TCPConnector()
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME, connector=connector)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    assert await client.get_user_id() == "mocked-user-id"
+    await client.disconnect()
+    assert client._session._aiohttp_session.closed
+    assert not connector.closed
+    await connector.close()
+
+
+@pytest.mark.asyncio
+async def test_client_rooms_and_groups(aiohttp_server) -> None:
+    """Rooms and groups are retrieved once and their devices are acted on concurrently."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, SERVICE_NAME)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    rooms = await client.get_rooms()
+    assert rooms["room_living"]["name"] == "Living room"
+    assert rooms["room_living"]["devices"] == ["L4HActuator_idmock1", "L4HActuator_idmock2"]
+    assert rooms["room_kitchen"]["devices"] == []
+    groups = await client.get_groups()
+    assert groups["group_lights"]["devices"] == ["L4HActuator_idmock2"]
+
+    paths = set()
+    while not recording_queue.empty():
+        paths.add((await recording_queue.get())["path"])
+    assert paths == {"/room", "/device", "/group"}
+
+    # Only the shutters of the room are moved, the rooms being served from the cache.
+    results = await client.move_room_shutters("Living room", 40)
+    assert results == {"L4HActuator_idmock1": None}
+    request = await recording_queue.get()
+    assert request["path"] == "/device/L4HActuator_idmock1/action/openlevel"
+    assert recording_queue.empty()
+
+    results = await client.switch_group("group_lights", True)
+    assert results == {"L4HActuator_idmock2": None}
+
+    with pytest.raises(DIOChaconAPIError):
+        await client.move_room_shutters("Attic", 40)
+
+    await client.disconnect()
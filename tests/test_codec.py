@@ -0,0 +1,38 @@
+# coding: utf-8
+"""Tests codec.py. JSON codecs."""
+import json
+import sys
+
+from aiohttp_fake_server_utils import build_device_states_data
+from dio_chacon_wifi_api.codec import get_default_codec
+from dio_chacon_wifi_api.codec import JSONCodec
+from dio_chacon_wifi_api.codec import STDLIB_JSON_CODEC
+
+
+def test_default_codec_roundtrip() -> None:
+    """The default codec decodes and encodes like the stdlib json."""
+
+    codec = get_default_codec()
+    message = {"id": 3, "status": 200, "data": build_device_states_data(2)}
+
+    encoded = codec.dumps(message)
+    assert isinstance(encoded, str)
+    assert json.loads(encoded) == message
+    assert codec.loads(json.dumps(message)) == message
+
+
+def test_default_codec_fallback_to_stdlib(monkeypatch) -> None:
+    """Without orjson nor ujson installed, the stdlib json is used."""
+
+    monkeypatch.setitem(sys.modules, "orjson", None)
+    monkeypatch.setitem(sys.modules, "ujson", None)
+
+    assert get_default_codec() is STDLIB_JSON_CODEC
+
+
+def test_custom_codec() -> None:
+    """Any pair of loads / dumps callables is a codec."""
+
+    codec = JSONCodec(json.loads, lambda obj: json.dumps(obj, separators=(",", ":")))
+    assert codec.dumps({"id": 1}) == '{"id":1}'
+    assert codec.name == "custom"
@@ -14,3 +14,39 @@ def test_enum() -> None:
     assert DeviceTypeEnum("SWITCH_PLUG") in [DeviceTypeEnum.SWITCH_LIGHT, DeviceTypeEnum.SWITCH_PLUG]
     assert "SWITCH_PLUG" not in [DeviceTypeEnum.SWITCH_LIGHT, DeviceTypeEnum.SWITCH_PLUG]
     # ValueError : assert DeviceTypeEnum("toto") not in [DeviceTypeEnum.SWITCH_LIGHT, DeviceTypeEnum.SWITCH_PLUG]
+
+
+def _reference_from_dio_api(label: str) -> DeviceTypeEnum:
+    """The original uncached classification, to check the compatibility with it."""
+    dict_array = [
+        {'label': ".wifi.shutter.", 'code': "SHUTTER"},
+        {'label': ".wifi.genericSwitch.", 'code': "SWITCH_LIGHT"},
+        {'label': ".wifi.plug.", 'code': "SWITCH_PLUG"},
+        {'label': ".wifi.doorBell.", 'code': "DOORBELL"},
+    ]
+    for d in dict_array:
+        if d['label'] in label:
+            return DeviceTypeEnum(d['code'])
+    return DeviceTypeEnum.UNKNOWN
+
+
+LABELS = [
+    ".dio1.wifi.shutter.mvt_linear.",
+    ".dio1.wifi.genericSwitch.switch.",
+    ".dio1.wifi.plug.switch.",
+    ".wifi.doorBell.camera.videostream.",
+    ".wifi.plug.wifi.shutter.",
+    ".dio1.wifi.unknown.",
+    "SWITCH_LIGHT",
+    "SHUTTER",
+    "",
+]
+
+
+def test_enum_compatibility() -> None:
+    """The cached classification gives the same results as the original one."""
+    for label in LABELS:
+        assert DeviceTypeEnum.from_dio_api(label) == _reference_from_dio_api(label)
+        for device_type in DeviceTypeEnum:
+            expected = _reference_from_dio_api(label) == device_type or label in [e.value for e in DeviceTypeEnum]
+            assert device_type.equals(label) == expected
@@ -0,0 +1,125 @@
+# coding: utf-8
+"""Tests dispatch.py. CallbackDispatcher class."""
+import asyncio
+
+import pytest
+from dio_chacon_wifi_api.const import DispatchOverflowEnum
+from dio_chacon_wifi_api.dispatch import CallbackDispatcher
+from dio_chacon_wifi_api.dispatch import EventCoalescer
+from dio_chacon_wifi_api.records import DeviceState
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_order_and_concurrency() -> None:
+    """Events of a device are delivered in order while devices are delivered concurrently."""
+
+    delivered: list = []
+    release_device_1 = asyncio.Event()
+
+    async def deliver(event: dict) -> None:
+        if event["id"] == "device_1":
+            await release_device_1.wait()
+        delivered.append((event["id"], event["value"]))
+
+    dispatcher = CallbackDispatcher(deliver, max_pending_events=10)
+    for value in range(3):
+        dispatcher.dispatch("device_1", {"id": "device_1", "value": value})
+    dispatcher.dispatch("device_2", {"id": "device_2", "value": 0})
+
+    # The blocked device does not prevent the delivery of the other one.
+    await asyncio.sleep(0.01)
+    assert delivered == [("device_2", 0)]
+
+    release_device_1.set()
+    await dispatcher.join()
+    assert delivered[1:] == [("device_1", 0), ("device_1", 1), ("device_1", 2)]
+    assert dispatcher.pending_events == 0
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_overflow_policies() -> None:
+    """A full device queue either drops its oldest event or coalesces the new one."""
+
+    delivered: list = []
+
+    async def deliver(event: dict) -> None:
+        delivered.append(event)
+
+    dispatcher = CallbackDispatcher(deliver, max_pending_events=2)
+    for value in range(4):
+        dispatcher.dispatch("device_1", {"id": "device_1", "value": value})
+    await dispatcher.join()
+    assert [event["value"] for event in delivered] == [2, 3]
+    assert dispatcher.dropped_count == 2
+
+    delivered.clear()
+    dispatcher = CallbackDispatcher(deliver, max_pending_events=2, overflow_policy=DispatchOverflowEnum.COALESCE)
+    dispatcher.dispatch("device_1", {"id": "device_1", "value": 0})
+    dispatcher.dispatch("device_1", {"id": "device_1", "value": 1})
+    dispatcher.dispatch("device_1", {"id": "device_1", "value": 2, "movement": "stop"})
+    await dispatcher.join()
+    assert delivered == [{"id": "device_1", "value": 0}, {"id": "device_1", "value": 2, "movement": "stop"}]
+    assert dispatcher.coalesced_count == 1
+
+    # A coalesced record stays a record.
+    delivered.clear()
+    dispatcher.dispatch("device_1", DeviceState(id="device_1", openlevel=10))
+    dispatcher.dispatch("device_1", DeviceState(id="device_1", openlevel=20))
+    dispatcher.dispatch("device_1", DeviceState(id="device_1", movement="stop"))
+    await dispatcher.join()
+    assert isinstance(delivered[1], DeviceState)
+    assert delivered[1] == {"id": "device_1", "openlevel": 20, "movement": "stop"}
+
+
+@pytest.mark.asyncio
+async def test_dispatcher_callback_error_does_not_stop_delivery() -> None:
+    """An exception raised by a callback is logged and the next events are still delivered."""
+
+    delivered: list = []
+
+    async def deliver(event: dict) -> None:
+        if event["value"] == 0:
+            raise ValueError("Callback failure")
+        delivered.append(event["value"])
+
+    dispatcher = CallbackDispatcher(deliver, max_pending_events=10)
+    dispatcher.dispatch("device_1", {"id": "device_1", "value": 0})
+    dispatcher.dispatch("device_1", {"id": "device_1", "value": 1})
+    await dispatcher.join()
+    assert delivered == [1]
+
+    await dispatcher.close()
+
+
+def _movement_event(level: int, movement: str) -> dict:
+    return {"id": "shutter_1", "openlevel": level, "movement": movement}
+
+
+@pytest.mark.asyncio
+async def test_coalescer_delivers_latest_and_stop() -> None:
+    """Within the window only the latest event is delivered and a stop is always delivered at once."""
+
+    emitted: list = []
+    coalescer = EventCoalescer(0.05, emitted.append)
+
+    coalescer.push(_movement_event(100, "down"))
+    for level in (90, 80, 70):
+        coalescer.push(_movement_event(level, "down"))
+    assert emitted == [_movement_event(100, "down")]
+
+    await asyncio.sleep(0.08)
+    assert emitted[-1] == _movement_event(70, "down")
+
+    coalescer.push(_movement_event(60, "down"))
+    coalescer.push(_movement_event(55, "stop"))
+    assert emitted[-1] == _movement_event(55, "stop")
+    assert len(emitted) == 3
+    assert coalescer.coalesced_count == 3
+
+    # The stop closed the window : the next event is delivered at once.
+    coalescer.push(_movement_event(55, "up"))
+    assert emitted[-1] == _movement_event(55, "up")
+
+    await asyncio.sleep(0.08)
+    assert len(emitted) == 4
+    coalescer.close()
@@ -0,0 +1,90 @@
+# coding: utf-8
+"""Tests inventory.py. Devices inventory kept current by the server events."""
+import asyncio
+
+import pytest
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.inventory import device_from_dio_api
+from dio_chacon_wifi_api.inventory import DeviceInventory
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+
+
+def _raw_device(device_id: str, name: str, **kwargs) -> dict:
+    return {
+        "id": device_id,
+        "name": name,
+        "type": ".dio1.wifi.genericSwitch.switch.",
+        "modelName": "CWMSwd-2B",
+        "softwareVersion": "1.0.6",
+        **kwargs,
+    }
+
+
+def test_inventory_incremental_updates() -> None:
+    """The first listing loads the inventory, the next changes are reported one by one."""
+
+    inventory = DeviceInventory()
+    assert inventory.load([device_from_dio_api(_raw_device("id1", "Light", roomId="r1"))]) == []
+    assert inventory.get("id1")["model"] == "CWMSwd-2B_1.0.6"
+
+    change = inventory.apply_update(_raw_device("id1", "Kitchen light", roomId="r1", roomName="Kitchen"))
+    assert change["action"] == "updated"
+    assert change["previous"]["name"] == "Light"
+    assert change["device"]["name"] == "Kitchen light"
+    assert inventory.get("id1").room_name == "Kitchen"
+
+    # Same description again : no change.
+    assert inventory.apply_update(_raw_device("id1", "Kitchen light", roomId="r1", roomName="Kitchen")) is None
+    # Unsupported devices are ignored.
+    assert inventory.apply_update({**_raw_device("id9", "Camera"), "type": ".dio1.camera.unknown"}) is None
+
+    # A new listing keeps the room name, unknown to the listing, and reports the removed devices.
+    changes = inventory.load([device_from_dio_api(_raw_device("id2", "Plug"))])
+    assert {(change["id"], change["action"]) for change in changes} == {("id2", "added"), ("id1", "removed")}
+    assert "id1" not in inventory
+    inventory.apply_update(_raw_device("id2", "Plug", roomId="r2", roomName="Garage"))
+    assert inventory.load([device_from_dio_api(_raw_device("id2", "Plug", roomId="r2"))]) == []
+    assert inventory.get("id2").room_name == "Garage"
+
+
+@pytest.mark.asyncio
+async def test_client_inventory_from_device_events(aiohttp_server) -> None:
+    """A device renamed in the mobile app is updated in the client inventory and notified."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    push_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue, push_queue=push_queue)
+
+    changes: asyncio.Queue = asyncio.Queue()
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, callback_inventory=changes.put_nowait)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    await client.search_all_devices()
+    assert client.get_inventory()["L4HActuator_idmock2"]["name"] == "Shutter mock 2"
+    assert "L4HActuator_idmock3" not in client.get_inventory()
+    assert changes.empty()
+
+    await push_queue.put(
+        {
+            "name": "device",
+            "action": "update",
+            "data": {
+                **_raw_device("L4HActuator_idmock2", "New name for light", roomId="r1", roomName="Living room"),
+                "provider": "L4HActuator",
+                "isNew": False,
+            },
+        }
+    )
+    change = await asyncio.wait_for(changes.get(), 5)
+    assert change["id"] == "L4HActuator_idmock2"
+    assert change["action"] == "updated"
+    inventory_device = client.get_inventory()["L4HActuator_idmock2"]
+    assert inventory_device["name"] == "New name for light"
+    assert inventory_device["room_name"] == "Living room"
+    assert change["device"] == inventory_device
+
+    await client.disconnect()
@@ -0,0 +1,74 @@
+# coding: utf-8
+"""Tests links.py. Device links extraction."""
+from aiohttp_fake_server_utils import build_device_states_data
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.const import SwitchOnOffEnum
+from dio_chacon_wifi_api.links import _validated_image_url
+from dio_chacon_wifi_api.links import extract_links_state
+from dio_chacon_wifi_api.links import extract_quietmode
+from dio_chacon_wifi_api.links import extract_shutter_calibration
+
+
+def _reference_extract_links_state(links: list) -> dict:
+    """The original chain of checks, to check the compatibility with it."""
+    state = {}
+    for link in links:
+        if link["rt"] == "oic.r.openlevel":
+            state["openlevel"] = link["openLevel"]
+        if link["rt"] == "oic.r.movement.linear":
+            state["movement"] = link["movement"]
+        if link["rt"] == "oic.r.switch.binary":
+            state["is_on"] = link["value"] == SwitchOnOffEnum.ON.value
+        if link["rt"] == "gw.r.lastEvent":
+            state["last_event_type"] = link["type"]
+            state["last_event_timestamp"] = link["ts"]
+            image = _validated_image_url(link.get("data", {}).get("image"))
+            if image is not None:
+                state["last_event_image"] = image
+    return state
+
+
+def test_extract_links_state() -> None:
+    """The known links are extracted, the other ones are skipped."""
+
+    links = [
+        {"rt": "oic.r.switch.binary", "value": 1},
+        {"rt": "gw.r.quietmode", "value": 1},
+        {"rt": "gw.r.lastEvent", "type": "ring", "ts": 12, "data": {"image": "http://insecure/image.jpg"}},
+    ]
+    assert extract_links_state(links) == {"is_on": True, "last_event_type": "ring", "last_event_timestamp": 12}
+
+    for device in build_device_states_data(10).values():
+        assert extract_links_state(device["links"]) == _reference_extract_links_state(device["links"])
+
+
+def test_client_registered_link_extractors() -> None:
+    """Extra links are extracted once registered, for this client only."""
+
+    events = []
+    client = DIOChaconAPIClient(callback_device_state=events.append)
+    client.register_link_extractor("gw.r.quietmode", extract_quietmode)
+    client.register_link_extractor("gw.r.shutter.calibration", extract_shutter_calibration)
+
+    client._message_received_callback(
+        {
+            "name": "deviceState",
+            "action": "update",
+            "data": {
+                "di": "L4HActuator_idmock1",
+                "rc": 1,
+                "links": [
+                    {"rt": "oic.r.openlevel", "openLevel": 40},
+                    {"rt": "gw.r.quietmode", "value": 1},
+                    {"rt": "gw.r.shutter.calibration", "up_ms": 10683, "down_ms": 10370},
+                ],
+            },
+        }
+    )
+    assert events[0]["openlevel"] == 40
+    assert events[0]["quiet_mode"]
+    assert events[0]["calibration_up_ms"] == 10683
+    assert events[0]["calibration_down_ms"] == 10370
+
+    # Other clients keep the default extractors.
+    assert "quiet_mode" not in DIOChaconAPIClient()._extract_links_state([{"rt": "gw.r.quietmode", "value": 1}])
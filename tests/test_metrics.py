@@ -0,0 +1,111 @@
+# coding: utf-8
+"""Tests metrics.py. Client latency and throughput metrics."""
+import asyncio
+
+import pytest
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.const import ShutterMoveEnum
+from dio_chacon_wifi_api.exceptions import DIOChaconAPIError
+from dio_chacon_wifi_api.metrics import ClientMetrics
+from dio_chacon_wifi_api.metrics import normalize_path
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+
+
+def test_metrics_exports() -> None:
+    """Latencies are grouped by request path without device id and exported as a dict and as Prometheus text."""
+
+    assert normalize_path("/device/L4HActuator_idmock1/action/openlevel") == "/device/{id}/action/openlevel"
+    assert normalize_path("/device/states") == "/device/states"
+    assert normalize_path("/user") == "/user"
+
+    metrics = ClientMetrics()
+    metrics.register_gauge("in_flight_requests", lambda: 3)
+    metrics.register_counter("evicted_requests", lambda: 2)
+    metrics.observe_request("/device/id1/action/openlevel", 0.004)
+    metrics.observe_request("/device/id2/action/openlevel", 0.2)
+    metrics.observe_request("/device/id2/action/openlevel", 10, success=False)
+    metrics.observe_frame(100)
+    metrics.on_connected()
+    metrics.on_connection_lost()
+    metrics.on_connected()
+
+    exported = metrics.as_dict()
+    histogram = exported["requests"]["/device/{id}/action/openlevel"]
+    assert histogram["count"] == 2
+    assert histogram["errors"] == 1
+    assert histogram["buckets"]["0.005"] == 1
+    assert histogram["buckets"]["0.25"] == 2
+    assert histogram["buckets"]["+Inf"] == 2
+    assert exported["frames_received"] == 1
+    assert exported["bytes_received"] == 100
+    assert exported["connections"] == 2
+    assert exported["reconnections"] == 1
+    assert exported["in_flight_requests"] == 3
+    assert exported["evicted_requests"] == 2
+    # Only counters : the rates are computed by each consumer between its own exports.
+    assert "frames_per_second" not in exported
+
+    text = metrics.as_prometheus({"account": 'home "1"'})
+    assert "# TYPE dio_chacon_request_duration_seconds histogram" in text
+    assert (
+        'dio_chacon_request_duration_seconds_bucket{account="home \\"1\\"",path="/device/{id}/action/openlevel",'
+        'le="+Inf"} 2' in text
+    )
+    assert 'dio_chacon_request_errors_total{account="home \\"1\\"",path="/device/{id}/action/openlevel"} 1' in text
+    assert 'dio_chacon_reconnections_total{account="home \\"1\\""} 1' in text
+    assert 'dio_chacon_in_flight_requests{account="home \\"1\\""} 3' in text
+    assert "# TYPE dio_chacon_evicted_requests_total counter" in text
+
+
+@pytest.mark.asyncio
+async def test_client_metrics(aiohttp_server) -> None:
+    """The client records the requests round trip times, the timeouts, the frames and the callbacks."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, callback_device_state=lambda data: None)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    await client.get_user_id()
+    await client.move_shutter_direction("L4HActuator_idmock1", ShutterMoveEnum.UP)
+    # The fake server never answers this request.
+    with pytest.raises(DIOChaconAPIError):
+        await client._send_ws_message("GET", "/static/all", {}, timeout=0.1)
+
+    exported = client.metrics.as_dict()
+    assert exported["requests"]["/user"]["count"] == 1
+    assert exported["requests"]["/device/{id}/action/mvtlinear"]["count"] == 1
+    assert exported["requests"]["/static/all"]["errors"] == 1
+    assert exported["connections"] == 1
+    assert exported["frames_received"] >= 3
+    assert exported["in_flight_requests"] == 0
+
+    # Waits for the server side event pushed after the shutter move.
+    for _ in range(50):
+        if client.metrics.callback_latency.count:
+            break
+        await asyncio.sleep(0.02)
+    assert client.metrics.callback_latency.count >= 1
+
+    await client.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_coroutine_callback_latency() -> None:
+    """The duration of a coroutine callback is observed once it is done, not once it is created."""
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD)
+
+    async def slow_callback(data: dict) -> None:
+        await asyncio.sleep(0.05)
+
+    client._run_callback(slow_callback, {"id": "L4HActuator_idmock1"})
+    assert client.metrics.callback_latency.count == 0
+    await asyncio.gather(*client._callback_tasks)
+    assert client.metrics.callback_latency.count == 1
+    assert client.metrics.callback_latency.sum >= 0.05
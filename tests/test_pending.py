@@ -0,0 +1,47 @@
+# coding: utf-8
+"""Tests pending.py. PendingResponses class."""
+import asyncio
+
+import pytest
+from dio_chacon_wifi_api.exceptions import DIOChaconAPIError
+from dio_chacon_wifi_api.pending import PendingResponses
+
+
+@pytest.mark.asyncio
+async def test_pending_responses_max_size() -> None:
+    """The oldest request is evicted and fails when the store is full."""
+
+    loop = asyncio.get_running_loop()
+    pending = PendingResponses(max_size=2)
+    futures = [loop.create_future() for _ in range(3)]
+    for msg_id, future in enumerate(futures):
+        pending.add(msg_id, future)
+
+    assert len(pending) == 2
+    assert pending.evicted_count == 1
+    with pytest.raises(DIOChaconAPIError):
+        await futures[0]
+
+    assert pending.resolve(2, {"id": 2})
+    assert (await futures[2])["id"] == 2
+    assert len(pending) == 1
+
+
+@pytest.mark.asyncio
+async def test_pending_responses_orphans() -> None:
+    """The late responses of the requests discarded at their timeout are counted as orphaned."""
+
+    loop = asyncio.get_running_loop()
+    pending = PendingResponses(max_size=10)
+    pending.add(1, loop.create_future())
+    pending.add(2, loop.create_future())
+    # The request 1 timed out.
+    pending.discard(1)
+
+    assert len(pending) == 1
+    assert pending.evicted_count == 0
+
+    assert not pending.resolve(1, {"id": 1})
+    assert pending.orphaned_count == 1
+    assert pending.resolve(2, {"id": 2})
+    assert len(pending) == 0
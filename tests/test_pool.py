@@ -0,0 +1,99 @@
+# coding: utf-8
+"""Tests pool.py. DIOChaconAccountPool class."""
+import asyncio
+
+import aiohttp
+import pytest
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.exceptions import DIOChaconAPIError
+from dio_chacon_wifi_api.exceptions import DIOChaconInvalidAuthError
+from dio_chacon_wifi_api.pool import DIOChaconAccountPool
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+INVALID_PASSWORD = 'PASS_INVALID_AUTH'
+
+
+@pytest.mark.asyncio
+async def test_pool_connect_all_and_health(aiohttp_server) -> None:
+    """All the accounts are connected through one shared session, failures are reported per account."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    pool = DIOChaconAccountPool(max_concurrent_connections=2, connect_interval=0.001)
+    pool._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    for index in range(5):
+        pool.add_account(f"account{index}", USERNAME, PASSWORD)
+    pool.add_account("bad_account", USERNAME, INVALID_PASSWORD)
+    assert len(pool) == 6
+    assert pool.get_health()["account0"]["state"] == "idle"
+
+    with pytest.raises(DIOChaconAPIError):
+        pool.add_account("account0", USERNAME, PASSWORD)
+
+    results = await pool.connect_all()
+    assert [account_id for account_id, error in results.items() if error is None] == [
+        f"account{index}" for index in range(5)
+    ]
+    assert isinstance(results["bad_account"], DIOChaconInvalidAuthError)
+
+    health = pool.get_health()
+    assert health["account3"]["state"] == "connected"
+    assert health["account3"]["connection_number"] == 1
+    assert health["account3"]["last_connected_at"] is not None
+    assert health["bad_account"]["last_error"] == "Invalid username/password."
+    assert health["bad_account"]["state"] == "stopped"
+    assert health["bad_account"]["connection_number"] == 0
+
+    # A single HTTP session serves all the accounts.
+    shared_session = pool._aiohttp_session
+    assert all(pool.get_client(f"account{index}")._session._aiohttp_session is shared_session for index in range(5))
+
+    assert await pool.get_client("account1").get_user_id() == "mocked-user-id"
+
+    await pool.remove_account("bad_account")
+    assert len(pool) == 5
+
+    await pool.disconnect_all()
+    assert shared_session.closed
+
+
+@pytest.mark.asyncio
+async def test_pool_events_routed_with_account_id(aiohttp_server) -> None:
+    """The server side events are given to the pool callback with the id of their account."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    push_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue, push_queue=push_queue)
+
+    received_events: asyncio.Queue = asyncio.Queue()
+
+    async def callback(account_id: str, data: dict) -> None:
+        await received_events.put((account_id, data))
+
+    async with aiohttp.ClientSession() as http_session:
+        pool = DIOChaconAccountPool(callback, aiohttp_session=http_session)
+        pool._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+        pool.add_account("only_account", USERNAME, PASSWORD)
+
+        async with pool:
+            await push_queue.put(
+                {
+                    "name": "deviceState",
+                    "action": "update",
+                    "data": {
+                        "di": "L4HActuator_idmock2",
+                        "rc": 1,
+                        "links": [{"rt": "oic.r.switch.binary", "value": 1}],
+                    },
+                }
+            )
+            account_id, event = await asyncio.wait_for(received_events.get(), 5)
+            assert account_id == "only_account"
+            assert event["id"] == "L4HActuator_idmock2"
+            assert pool.get_health()["only_account"]["events_count"] == 1
+
+        # The session given to the pool stays open.
+        assert not http_session.closed
@@ -0,0 +1,86 @@
+# coding: utf-8
+"""Tests records.py. Device and DeviceState records."""
+import asyncio
+import pickle
+
+import pytest
+from aiohttp_fake_server_utils import MOCK_PORT
+from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.client import DIOChaconAPIClient
+from dio_chacon_wifi_api.records import Device
+from dio_chacon_wifi_api.records import DeviceState
+from dio_chacon_wifi_api.state import DeviceStateCache
+
+USERNAME = 'toto@toto.com'
+PASSWORD = 'DUMMY_PASS'
+
+
+def test_record_dict_compatibility() -> None:
+    """A record reads, writes and compares like the dict of its keys set."""
+
+    state = DeviceState(id="L4HActuator_idmock1", connected=True)
+    state["openlevel"] = 75
+    state["quiet_mode"] = False
+
+    assert state["openlevel"] == 75
+    assert state.openlevel == 75
+    assert "movement" not in state
+    assert state.movement is None
+    assert state.get("movement", "stop") == "stop"
+    assert len(state) == 4
+    assert state == {"id": "L4HActuator_idmock1", "connected": True, "openlevel": 75, "quiet_mode": False}
+    assert dict(state) == {"id": "L4HActuator_idmock1", "connected": True, "openlevel": 75, "quiet_mode": False}
+
+    del state["openlevel"]
+    assert "openlevel" not in state
+
+    device = Device(id="L4HActuator_idmock1", name="Shutter", type="SHUTTER", model="CERSwd-3B_1.0.6")
+    device.update(state)
+    assert device["name"] == "Shutter"
+    assert device["quiet_mode"] is False
+    assert pickle.loads(pickle.dumps(device)) == device
+    assert device.copy() == device and device.copy() is not device
+
+
+def test_record_replace_and_to_dict() -> None:
+    """Replacing a record in place keeps only the new keys, slotted or not."""
+
+    state = DeviceState(id="L4HActuator_idmock1", openlevel=75, movement="up", quiet_mode=True)
+    state.replace({"id": "L4HActuator_idmock1", "connected": False, "calibration_up_ms": 1200})
+    assert state.to_dict() == {"id": "L4HActuator_idmock1", "connected": False, "calibration_up_ms": 1200}
+    assert state.openlevel is None and "quiet_mode" not in state
+
+    state.replace({"id": "L4HActuator_idmock1"})
+    assert type(state.to_dict()) is dict
+    assert state.to_dict() == {"id": "L4HActuator_idmock1"}
+
+
+def test_cache_replaces_records() -> None:
+    """The cached record of a device is replaced by the new states, the previous one is left unchanged."""
+
+    cache = DeviceStateCache()
+    cache.update("L4HActuator_idmock1", {"id": "L4HActuator_idmock1", "openlevel": 75, "movement": "up"})
+    record = cache.get("L4HActuator_idmock1")
+
+    cache.update("L4HActuator_idmock1", {"id": "L4HActuator_idmock1", "openlevel": 50})
+    assert cache.get("L4HActuator_idmock1") == {"id": "L4HActuator_idmock1", "openlevel": 50}
+    assert isinstance(cache.get("L4HActuator_idmock1"), DeviceState)
+    assert record == {"id": "L4HActuator_idmock1", "openlevel": 75, "movement": "up"}
+
+
+@pytest.mark.asyncio
+async def test_client_device_records(aiohttp_server) -> None:
+    """With device_records, the client returns and caches the records themselves instead of dicts."""
+
+    await run_fake_http_server(aiohttp_server, asyncio.Queue())
+
+    client = DIOChaconAPIClient(USERNAME, PASSWORD, cache_device_states=True, device_records=True)
+    client._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+
+    devices = await client.search_all_devices(with_state=True)
+    assert isinstance(devices["L4HActuator_idmock1"], Device)
+    assert devices["L4HActuator_idmock1"].openlevel == 75
+    assert isinstance(client.get_inventory()["L4HActuator_idmock1"], Device)
+    assert client.get_cached_state("L4HActuator_idmock1") is client.get_cached_states()["L4HActuator_idmock1"]
+    assert isinstance(client.get_cached_state("L4HActuator_idmock1"), DeviceState)
+    await client.disconnect()
@@ -0,0 +1,23 @@
+# coding: utf-8
+"""Tests retry.py. RetryPolicy class."""
+from dio_chacon_wifi_api.retry import RetryPolicy
+
+
+def test_retry_policy_backoff() -> None:
+    """Delays grow exponentially from the first delay up to the cap, without limit of attempts."""
+
+    policy = RetryPolicy(first_delay=1, max_delay=10, multiplier=2, jitter=0)
+
+    assert [policy.get_delay(attempt) for attempt in range(1, 7)] == [1, 2, 4, 8, 10, 10]
+    assert policy.get_delay(1000) == 10
+
+
+def test_retry_policy_jitter_and_max_attempts() -> None:
+    """Jitter only reduces the delay and the policy gives up after the maximum number of attempts."""
+
+    policy = RetryPolicy(first_delay=4, max_delay=60, jitter=0.5, max_attempts=3)
+
+    for _ in range(100):
+        assert 2 <= policy.get_delay(1) <= 4
+    assert policy.get_delay(3) is not None
+    assert policy.get_delay(4) is None
@@ -5,8 +5,10 @@ import logging
 from typing import Any
 
 import pytest
+from aiohttp import web
 from aiohttp_fake_server_utils import MOCK_PORT
 from aiohttp_fake_server_utils import run_fake_http_server
+from dio_chacon_wifi_api.retry import RetryPolicy
 from dio_chacon_wifi_api.session import DIOChaconClientSession
 
 _LOGGER = logging.getLogger(__name__)
@@ -43,3 +45,163 @@ async def test_session(aiohttp_server) -> None:
     message_queue.task_done()
 
     await session.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_session_wire_tracing(aiohttp_server, caplog) -> None:
+    """Wire traces are only produced, redacted, when the mode is enabled."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    message_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    session = DIOChaconClientSession(USERNAME, PASSWORD, SERVICE_NAME, message_queue.put_nowait)
+    assert not session._aiohttp_session.trace_configs
+    await session.disconnect()
+
+    caplog.set_level(logging.DEBUG, logger="dio_chacon_wifi_api.wire")
+    session = DIOChaconClientSession(USERNAME, PASSWORD, SERVICE_NAME, message_queue.put_nowait, wire_tracing=True)
+    assert len(session._aiohttp_session.trace_configs) == 1
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await session.ws_connect()
+    await asyncio.wait_for(message_queue.get(), 2)
+
+    wire_messages = [record.getMessage() for record in caplog.records if record.name == "dio_chacon_wifi_api.wire"]
+    assert any(message.startswith("http request_start") for message in wire_messages)
+    assert any(message.startswith("ws recv") for message in wire_messages)
+    assert not any(PASSWORD in message for message in wire_messages)
+
+    await session.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_session_reconnects_in_background(aiohttp_server) -> None:
+    """A lost websocket, whose connection was confirmed, is reopened at once in background by the same session."""
+
+    recording_queue: asyncio.Queue = asyncio.Queue()
+    message_queue: asyncio.Queue = asyncio.Queue()
+    await run_fake_http_server(aiohttp_server, recording_queue)
+
+    # The retry delay is far beyond the wait of the reconnection below.
+    session = DIOChaconClientSession(
+        USERNAME, PASSWORD, SERVICE_NAME, message_queue.put_nowait, retry_policy=RetryPolicy(first_delay=30)
+    )
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await session.ws_connect()
+    await asyncio.wait_for(message_queue.get(), 2)
+    assert session.is_connected()
+
+    await session._websocket.close()
+
+    message = await asyncio.wait_for(message_queue.get(), 2)
+    assert message["name"] == 'connection'
+    assert message["action"] == 'success'
+    assert session.is_connected()
+    assert not session.is_disconnected()
+    assert session._failed_attempts == 0
+
+    await session.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_session_gives_up_after_max_attempts() -> None:
+    """The session stops for good when the retry policy gives up."""
+
+    session = DIOChaconClientSession(
+        USERNAME,
+        PASSWORD,
+        SERVICE_NAME,
+        lambda data: None,
+        retry_policy=RetryPolicy(first_delay=0.01, jitter=0, max_attempts=2),
+    )
+    # Nothing listens on this port.
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT + 1}/ws")
+    await session.ws_connect()
+
+    await asyncio.wait_for(session._listen_task, 5)
+    assert session.is_disconnected()
+    assert session._failed_attempts == 3
+    assert not session.is_connected()
+
+    await session.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_session_disconnect_while_retrying() -> None:
+    """Disconnecting a session waiting before a retry cancels its listening task at once."""
+
+    session = DIOChaconClientSession(
+        USERNAME, PASSWORD, SERVICE_NAME, lambda data: None, retry_policy=RetryPolicy(first_delay=60)
+    )
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT + 1}/ws")
+    await session.ws_connect()
+    while session._failed_attempts == 0:
+        await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(session.disconnect(), 1)
+    assert session._listen_task.done()
+
+
+@pytest.mark.asyncio
+async def test_session_backoff_when_server_closes_at_once(aiohttp_server) -> None:
+    """A server accepting the websocket then closing it at once is retried with the backoff of the policy."""
+
+    accepted_connections = 0
+
+    async def closing_handler(request: web.Request) -> web.WebSocketResponse:
+        nonlocal accepted_connections
+        accepted_connections += 1
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.close()
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", closing_handler)])
+    await aiohttp_server(app, port=MOCK_PORT)
+
+    session = DIOChaconClientSession(
+        USERNAME,
+        PASSWORD,
+        SERVICE_NAME,
+        lambda data: None,
+        retry_policy=RetryPolicy(first_delay=0.05, jitter=0),
+    )
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await session.ws_connect()
+    await asyncio.sleep(0.5)
+
+    # Retries after 0.05, 0.1, 0.2 then 0.4s : never confirmed, the connections do not reset the backoff.
+    assert 2 <= accepted_connections <= 5
+    assert session._failed_attempts == accepted_connections
+
+    await session.disconnect()
+
+
+@pytest.mark.asyncio
+async def test_session_disconnect_bounded_when_server_does_not_close(aiohttp_server) -> None:
+    """Disconnect does not wait for a close frame that the server never sends beyond its timeout."""
+
+    async def unresponsive_handler(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_str('{"name":"connection","action":"success","data":""}')
+        # Never reads the websocket : the close frame of the client is not answered.
+        await asyncio.sleep(30)
+        return ws
+
+    app = web.Application()
+    app.add_routes([web.get("/ws", unresponsive_handler)])
+    await aiohttp_server(app, port=MOCK_PORT)
+
+    message_queue: asyncio.Queue = asyncio.Queue()
+    session = DIOChaconClientSession(USERNAME, PASSWORD, SERVICE_NAME, message_queue.put_nowait)
+    session._set_server_urls(f"ws://localhost:{MOCK_PORT}/ws")
+    await session.ws_connect()
+    await asyncio.wait_for(message_queue.get(), 2)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await session.disconnect(timeout=0.2)
+    assert loop.time() - start < 1
+    assert session._listen_task.done()
@@ -1,5 +1,6 @@
 # coding: utf-8
 """Tests utils.py shared helpers."""
+from dio_chacon_wifi_api.utils import redact_payload
 from dio_chacon_wifi_api.utils import redact_url
 from yarl import URL
 
@@ -48,3 +49,20 @@ def test_redact_url_masks_only_present_sensitive_keys() -> None:
     assert "password" not in redacted
     assert "sessionToken" not in redacted
     assert "serviceName=test_client" in redacted
+
+
+def test_redact_payload_masks_sensitive_keys_at_any_depth() -> None:
+    """Sensitive payload values are masked in nested dicts and lists, the other ones are kept."""
+
+    payload = {
+        "id": 1,
+        "status": 200,
+        "data": {"sessionToken": "r:abc123", "links": [{"rt": "gw.r.lastEvent", "data": {"image": "https://x/y?s=1"}}]},
+    }
+    redacted = redact_payload(payload)
+
+    assert redacted["id"] == 1
+    assert redacted["data"]["sessionToken"] == "***"
+    assert redacted["data"]["links"][0]["rt"] == "gw.r.lastEvent"
+    assert redacted["data"]["links"][0]["data"]["image"] == "***"
+    assert payload["data"]["sessionToken"] == "r:abc123"